@@ -14,6 +14,16 @@ class Config:
     # Disable modification tracking for SQLAlchemy, saves resources
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Engine options: a larger compiled-statement cache so the parameterized
+    # SELECTs behind transactions/budget/sync routes are compiled once and reused
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'query_cache_size': int(os.getenv('SQLALCHEMY_QUERY_CACHE_SIZE', '1200')),
+        # psycopg2: pack ORM executemany INSERTs into multi-row VALUES and batch UPDATEs
+        # (execute_batch) so bulk sync writes take a few round trips instead of one per row
+        'executemany_mode': 'values_plus_batch',
+        'executemany_batch_page_size': 500,
+    }
+
     # It's good practice to set a secret key for session management, etc.
     # Load from env var or use a default (change default for production)
     SECRET_KEY = os.getenv('SECRET_KEY', 'your_default_secret_key_change_me')
@@ -27,6 +37,9 @@ class Config:
     if not PLAID_CLIENT_ID or not PLAID_SECRET:
          raise RuntimeError("PLAID_CLIENT_ID or PLAID_SECRET environment variables not set.")
 
+    # Re-read PlaidItem rows after commit in exchange_public_token (debugging aid, off by default)
+    VERIFY_PLAID_WRITES = os.getenv('VERIFY_PLAID_WRITES', 'false').lower() in ('1', 'true')
+
     # --- Robinhood Configuration ---
     ROBINHOOD_PRI_KEY = os.getenv('ROBINHOOD_PRI_KEY')
     ROBINHOOD_PUB_KEY = os.getenv('ROBINHOOD_PUB_KEY')
@@ -1,3 +1,9 @@
+import datetime
+import decimal
+import threading
+import orjson
+from cachetools import TLRUCache
+from flask.json.provider import JSONProvider
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 import plaid
@@ -21,6 +27,44 @@ plaid_products = [
 ] # Default products
 plaid_country_codes = [CountryCode('US')] # Default country codes
 
+# --- Budget summary response cache ---
+# Serialized /api/budget/summary bodies keyed by (year, month, transactions data version).
+# Any committed transaction write bumps the version, so entries are never served stale across
+# workers; the TTL only bounds memory (60s for the current month, an hour for past months).
+def _budget_summary_ttu(key, value, now):
+    today = datetime.date.today()
+    return now + (60 if key[:2] == (today.year, today.month) else 3600)
+
+budget_summary_cache = TLRUCache(maxsize=64, ttu=_budget_summary_ttu)
+budget_summary_cache_lock = threading.Lock() # cachetools caches are not thread-safe
+
+# --- JSON Provider (orjson) ---
+def _orjson_default(obj):
+    """Handles types orjson does not serialize natively."""
+    if isinstance(obj, decimal.Decimal):
+        # Emit Decimals as raw JSON numbers (no float round-trip, no quotes)
+        return orjson.Fragment(str(obj)) if obj.is_finite() else None
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, so jsonify() goes through the C encoder."""
+    option = orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_orjson_default, option=self.option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Skip the bytes -> str -> bytes round-trip of the base implementation
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson_dumps(obj), mimetype='application/json')
+
+def orjson_dumps(obj) -> bytes:
+    """Serializes obj to JSON bytes with the same options as ORJSONProvider."""
+    return orjson.dumps(obj, default=_orjson_default, option=ORJSONProvider.option)
+
 def init_plaid(app):
     """Initializes the Plaid client using Flask app config."""
 
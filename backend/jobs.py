@@ -0,0 +1,240 @@
+# backend/jobs.py
+"""Background jobs run by the APScheduler instance created in app.py."""
+import datetime
+import threading
+import time
+from uuid import uuid4
+from extensions import db
+from models import Account, MarketPrice, PlaidItem, SyncTask
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
+
+# Job IDs: the recurring sync and the one-shot run queued by the manual trigger routes
+BACKGROUND_SYNC_JOB_ID = 'background_sync_job'
+MANUAL_SYNC_JOB_ID = 'background_sync_manual'
+
+# Postgres advisory lock (keyed by hashtext of this name) held for a whole sync cycle, so the
+# recurring and manual runs never overlap, within a process or across gunicorn workers
+SYNC_LOCK_NAME = 'background_sync'
+
+# Manual triggers closer together than this are coalesced into the last queued run
+# (per process; each gunicorn worker has its own scheduler anyway)
+MANUAL_SYNC_DEBOUNCE_SEC = 5
+_last_manual_sync = [0.0] # time.monotonic() of the last queued manual run
+_manual_sync_lock = threading.Lock()
+
+# Status/results of one-shot sync tasks live in the sync_task table (polled via GET /api/jobs/<job_id>)
+SYNC_TASK_RETENTION = datetime.timedelta(days=1)
+
+# --- Background Job Function ---
+def _try_sync_lock(conn):
+    """Tries (without waiting) to take the session-level sync advisory lock on `conn`."""
+    return conn.execute(select(func.pg_try_advisory_lock(func.hashtext(SYNC_LOCK_NAME)))).scalar()
+
+def _release_sync_lock(conn):
+    conn.execute(select(func.pg_advisory_unlock(func.hashtext(SYNC_LOCK_NAME))))
+
+def background_sync_job(app):
+    """
+    Runs one sync cycle (prices, then transactions) unless another cycle, recurring or
+    manual and in any worker process, already holds the sync lock; then this run is skipped.
+    """
+    with app.app_context():
+        # Session-level lock on a dedicated autocommit connection, held for the whole cycle
+        with db.engine.execution_options(isolation_level='AUTOCOMMIT').connect() as lock_conn:
+            if not _try_sync_lock(lock_conn):
+                app.logger.info("Background job: Another sync cycle is already running. Skipping this run.")
+                return
+            try:
+                _run_sync_cycle(app)
+            finally:
+                _release_sync_lock(lock_conn)
+
+def background_sync_running():
+    """True if a sync cycle currently holds the sync lock (in any worker process). Needs an app context."""
+    with db.engine.execution_options(isolation_level='AUTOCOMMIT').connect() as conn:
+        if not _try_sync_lock(conn):
+            return True
+        _release_sync_lock(conn)
+        return False
+
+def _run_sync_cycle(app):
+    """Fetches prices for held assets into MarketPrice, then syncs Plaid transactions."""
+    with app.app_context(): # IMPORTANT: Need app context to use extensions, config, db
+        app.logger.info("Background job: Starting price fetch...")
+        start_time = time.time()
+        md_service = app.extensions.get('market_data_client')
+        if not md_service:
+            app.logger.warning("Background job: Market data service not available. Skipping price fetch.")
+            return
+
+        symbols_to_fetch = set()
+        try:
+            # Get unique symbols from investment/crypto accounts
+            accounts = Account.query.filter(
+                Account.account_type.in_(['investment', 'crypto'])
+            ).all()
+            for acc in accounts:
+                if acc.account_subtype: # Assuming subtype holds the symbol
+                     # Basic normalization (adapt if needed)
+                     normalized_symbol = acc.account_subtype.upper().replace('-USD', '')
+                     if normalized_symbol:
+                        symbols_to_fetch.add((normalized_symbol, acc.account_type)) # Store type too
+
+        except Exception as e:
+            app.logger.error(f"Background job: Error fetching symbols from DB: {e}", exc_info=True)
+            return # Exit job if symbols can't be fetched
+
+        if not symbols_to_fetch:
+             app.logger.info("Background job: No investment/crypto symbols found in accounts to update.")
+             return
+
+        app.logger.info(f"Background job: Found {len(symbols_to_fetch)} unique symbols to fetch prices for.")
+        updated_count = 0
+        created_count = 0
+        failed_count = 0
+
+        # Fetch all prices concurrently (the service caps in-flight requests), then save them one by one
+        fetch_pairs = [(acc_type, symbol) for symbol, acc_type in symbols_to_fetch]
+        try:
+            # No stale fallbacks: a failed fetch must leave the stored price and its last_updated untouched
+            prices = md_service.get_prices_bulk(fetch_pairs, allow_stale=False)
+        except Exception as fetch_err:
+            app.logger.error(f"Background job: Error fetching prices: {fetch_err}", exc_info=True)
+            prices = {}
+
+        for acc_type, symbol in fetch_pairs:
+            price_usd = prices.get((acc_type, symbol))
+            if price_usd is not None:
+                # Update or Create in MarketPrice table
+                try:
+                    mp = MarketPrice.query.filter_by(symbol=symbol).first()
+                    if mp:
+                        mp.price_usd = price_usd
+                        mp.last_updated = db.func.now() # Update timestamp using server time
+                        app.logger.debug(f"Background job: Updating price for {symbol}: {price_usd}")
+                        updated_count +=1
+                    else:
+                        mp = MarketPrice(symbol=symbol, price_usd=price_usd)
+                        db.session.add(mp)
+                        app.logger.info(f"Background job: Creating price for {symbol}: {price_usd}")
+                        created_count += 1
+                    db.session.commit() # Commit after each successful update/create
+                except SQLAlchemyError as db_err:
+                     db.session.rollback()
+                     app.logger.error(f"Background job: DB error saving price for {symbol}: {db_err}", exc_info=True)
+                     failed_count += 1
+                except Exception as inner_e: # Catch other unexpected errors during DB operation
+                     db.session.rollback()
+                     app.logger.error(f"Background job: Unexpected error saving price for {symbol}: {inner_e}", exc_info=True)
+                     failed_count += 1
+            else:
+                app.logger.warning(f"Background job: Failed to fetch price for {symbol}")
+                failed_count += 1
+
+        # --- Transaction Fetching (Use PlaidService) ---
+        app.logger.info("Background job: Starting transaction sync...")
+        try:
+            plaid_service = app.extensions.get('plaid_service')
+            if not plaid_service:
+                app.logger.warning("Background job: Plaid service not available. Skipping transaction sync.")
+            else:
+                # Fetch all items for the user
+                items_to_sync = PlaidItem.query.filter_by(user_id='finsmar-local-user-01').all()
+                app.logger.info(f"Background job: Found {len(items_to_sync)} Plaid items for transaction sync.")
+                success_count = 0
+                fail_count = 0
+                for item in items_to_sync:
+                    # Call the service method for each item
+                    success = plaid_service.sync_transactions_for_item(item)
+                    if success:
+                         success_count += 1
+                    else:
+                         fail_count += 1
+                    # Optional small delay between syncing different bank items?
+                    # time.sleep(1)
+                app.logger.info(f"Background job: Transaction sync portion complete. Succeeded Items: {success_count}, Failed Items: {fail_count}")
+                # Trim history once for all items (the cutoff is the same for every item)
+                if success_count:
+                    plaid_service.cleanup_old_transactions()
+
+        except Exception as e:
+             app.logger.error(f"Background job: Error during transaction syncing: {e}", exc_info=True)
+        # --------------------------------------------------
+
+        end_time = time.time()
+        app.logger.info(f"Background job: Sync cycle finished in {end_time - start_time:.2f} seconds.")
+        app.logger.info(f"Background job: Price fetch complete. Updated: {updated_count}, Created: {created_count}, Failed: {failed_count}")
+
+def enqueue_background_sync(app):
+    """
+    Queues a one-shot run of background_sync_job on the scheduler's worker pool.
+    The recurring job's schedule is left untouched. Returns (status, job):
+    ('running', None) if a sync cycle is executing right now (nothing is queued),
+    ('pending', job) if a manual run is already waiting, ('coalesced', None) for triggers
+    within MANUAL_SYNC_DEBOUNCE_SEC of the last queued run, else ('queued', job).
+    """
+    scheduler = app.extensions['scheduler']
+    with _manual_sync_lock:
+        # A dispatched one-shot job leaves the jobstore while it runs, so ask the lock instead;
+        # queueing now would only be skipped once the job fires
+        if background_sync_running():
+            return 'running', None
+        pending = scheduler.get_job(MANUAL_SYNC_JOB_ID)
+        if pending:
+            return 'pending', pending
+        now = time.monotonic()
+        if now - _last_manual_sync[0] < MANUAL_SYNC_DEBOUNCE_SEC:
+            return 'coalesced', None
+        _last_manual_sync[0] = now
+        return 'queued', scheduler.add_job(background_sync_job, args=[app], id=MANUAL_SYNC_JOB_ID,
+                                           replace_existing=True, misfire_grace_time=600)
+
+# --- One-shot sync tasks ---
+def run_sync_task(app, job_id, task):
+    """
+    Runs a sync task (a zero-argument function returning a jsonify() response, optionally
+    with a status code) inside an app context and records its outcome for polling.
+    """
+    with app.app_context():
+        _set_task_result(job_id, 'running')
+        try:
+            rv = task()
+            response, status_code = rv if isinstance(rv, tuple) else (rv, 200)
+            _set_task_result(job_id, 'finished' if status_code < 400 else 'failed',
+                             status_code, response.get_json())
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Sync task {job_id}: Unexpected error: {e}", exc_info=True)
+            _set_task_result(job_id, 'failed', 500, {'error': 'Internal server error'})
+
+def enqueue_sync_task(app, task, name):
+    """Queues `task` as a one-shot scheduler job and returns its job id for polling."""
+    job_id = f"{name}_{uuid4().hex[:12]}"
+    with db.engine.begin() as conn:
+        conn.execute(delete(SyncTask).where(SyncTask.created_at < func.now() - SYNC_TASK_RETENTION))
+    _set_task_result(job_id, 'queued')
+    app.extensions['scheduler'].add_job(run_sync_task, args=[app, job_id, task], id=job_id,
+                                        misfire_grace_time=600)
+    return job_id
+
+def get_sync_task(job_id):
+    """Returns the recorded status/result for a sync task, or None if unknown or purged."""
+    task = db.session.get(SyncTask, job_id)
+    return task.to_dict() if task else None
+
+def _set_task_result(job_id, status, status_code=None, result=None):
+    """Upserts a task's status on its own connection, so it commits regardless of the task's session state."""
+    stmt = pg_insert(SyncTask).values(job_id=job_id, status=status, status_code=status_code, result=result)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['job_id'],
+        set_={
+            'status': stmt.excluded.status,
+            'status_code': stmt.excluded.status_code,
+            'result': stmt.excluded.result,
+            'updated_at': func.now()
+        }
+    )
+    with db.engine.begin() as conn:
+        conn.execute(stmt)
@@ -0,0 +1,33 @@
+"""Add partial (date, budget_category) index on transaction
+
+Revision ID: 3f6a1c2d9e47
+Revises: 0b2319955b03
+Create Date: 2026-10-15 09:12:41.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6a1c2d9e47'
+down_revision = '0b2319955b03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Budget summary routes filter by date range and group by category, excluding
+    # Income/Transfers. Verify with EXPLAIN (ANALYZE, BUFFERS) that this is picked up.
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_tx_date_cat', ['date', 'budget_category'], unique=False,
+            postgresql_where=sa.text(
+                "budget_category IS NOT NULL AND budget_category NOT IN ('Income', 'Transfers')"
+            )
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_tx_date_cat')
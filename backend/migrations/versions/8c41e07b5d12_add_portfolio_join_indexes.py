@@ -0,0 +1,42 @@
+"""Add covering market_price symbol index and partial account subtype index
+
+Revision ID: 8c41e07b5d12
+Revises: 3f6a1c2d9e47
+Create Date: 2026-10-15 11:03:27.218664
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41e07b5d12'
+down_revision = '3f6a1c2d9e47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Portfolio overview joins account.account_subtype to market_price.symbol and reads
+    # price_usd/last_updated. Verify with EXPLAIN ANALYZE that the join uses an Index Only Scan.
+    with op.batch_alter_table('market_price', schema=None) as batch_op:
+        batch_op.drop_index('ix_market_price_symbol')
+        batch_op.create_index(
+            'ix_market_price_symbol', ['symbol'], unique=True,
+            postgresql_include=['price_usd', 'last_updated']
+        )
+
+    with op.batch_alter_table('account', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_account_priced_subtype', ['account_subtype'], unique=False,
+            postgresql_where=sa.text("account_type IN ('investment', 'crypto')")
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('account', schema=None) as batch_op:
+        batch_op.drop_index('ix_account_priced_subtype')
+
+    with op.batch_alter_table('market_price', schema=None) as batch_op:
+        batch_op.drop_index('ix_market_price_symbol')
+        batch_op.create_index('ix_market_price_symbol', ['symbol'], unique=True)
@@ -0,0 +1,28 @@
+"""Add (date, id) index on transaction for keyset pagination
+
+Revision ID: b7d2a94e1c08
+Revises: 8c41e07b5d12
+Create Date: 2026-10-15 13:47:05.391027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2a94e1c08'
+down_revision = '8c41e07b5d12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # /api/transactions orders by (date, id) and seeks past the cursor with a row comparison;
+    # this lets ORDER BY ... LIMIT read the index instead of sorting the whole table.
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.create_index('ix_tx_date_id', ['date', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_tx_date_id')
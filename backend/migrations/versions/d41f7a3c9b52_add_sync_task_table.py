@@ -0,0 +1,38 @@
+"""Add sync_task table for pollable background sync status
+
+Revision ID: d41f7a3c9b52
+Revises: b7d2a94e1c08
+Create Date: 2026-10-15 16:22:41.508317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f7a3c9b52'
+down_revision = 'b7d2a94e1c08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Task status shared by every worker process; rows are purged a day after creation.
+    op.create_table('sync_task',
+    sa.Column('job_id', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('status_code', sa.Integer(), nullable=True),
+    sa.Column('result', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('job_id')
+    )
+    with op.batch_alter_table('sync_task', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sync_task_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sync_task', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sync_task_created_at'))
+
+    op.drop_table('sync_task')
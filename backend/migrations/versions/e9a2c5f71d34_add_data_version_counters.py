@@ -0,0 +1,46 @@
+"""Add data_version counters and bump them on transaction writes
+
+Revision ID: e9a2c5f71d34
+Revises: d41f7a3c9b52
+Create Date: 2026-10-15 17:05:12.730946
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9a2c5f71d34'
+down_revision = 'd41f7a3c9b52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('data_version',
+    sa.Column('name', sa.String(length=32), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # Bumps data_version[TG_ARGV[0]] inside the writing transaction. Concurrent writers queue
+    # on the counter row, so readers see the new version exactly when the new rows commit.
+    op.execute("""
+        CREATE FUNCTION bump_data_version() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO data_version (name, version) VALUES (TG_ARGV[0], 1)
+            ON CONFLICT (name) DO UPDATE SET version = data_version.version + 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER transaction_data_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "transaction"
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('transactions')
+    """)
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS transaction_data_version ON "transaction"')
+    op.execute('DROP FUNCTION IF EXISTS bump_data_version()')
+    op.drop_table('data_version')
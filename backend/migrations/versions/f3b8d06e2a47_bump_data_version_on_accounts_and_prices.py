@@ -0,0 +1,35 @@
+"""Bump data_version counters on account and market_price writes
+
+Revision ID: f3b8d06e2a47
+Revises: e9a2c5f71d34
+Create Date: 2026-10-15 17:48:36.114502
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d06e2a47'
+down_revision = 'e9a2c5f71d34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Versions key the portfolio overview ETag/cache (bump_data_version() comes from e9a2c5f71d34)
+    op.execute("""
+        CREATE TRIGGER account_data_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON account
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('accounts')
+    """)
+    op.execute("""
+        CREATE TRIGGER market_price_data_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON market_price
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('prices')
+    """)
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS market_price_data_version ON market_price')
+    op.execute('DROP TRIGGER IF EXISTS account_data_version ON account')
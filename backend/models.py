@@ -2,9 +2,19 @@ from extensions import db # Import db instance from extensions.py
 from sqlalchemy import func, ForeignKey
 from sqlalchemy.orm import relationship
 
+# Budget categories excluded from spending summaries (matches the partial index predicate below)
+NON_SPENDING_CATEGORIES = ('Income', 'Transfers')
+
 # Define the Account model
 class Account(db.Model):
     __tablename__ = 'account' # Optional: explicitly set table name
+    __table_args__ = (
+        # Supports the portfolio JOIN onto market_price (only priced accounts carry a symbol)
+        db.Index(
+            'ix_account_priced_subtype', 'account_subtype',
+            postgresql_where=db.text("account_type IN ('investment', 'crypto')")
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), nullable=False)
@@ -83,10 +93,17 @@ class PlaidItem(db.Model):
 
 class MarketPrice(db.Model):
     __tablename__ = 'market_price'
+    __table_args__ = (
+        # Unique on symbol, covering the price columns so the portfolio JOIN is an index-only scan
+        db.Index(
+            'ix_market_price_symbol', 'symbol', unique=True,
+            postgresql_include=['price_usd', 'last_updated']
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    # Symbol (e.g., 'AAPL', 'BTC', 'ETH') - should be unique
-    symbol = db.Column(db.String(20), unique=True, nullable=False, index=True)
+    # Symbol (e.g., 'AAPL', 'BTC', 'ETH') - should be unique (see ix_market_price_symbol)
+    symbol = db.Column(db.String(20), nullable=False)
     # Store price with sufficient precision
     price_usd = db.Column(db.Numeric(18, 8), nullable=False)
     # Track when the price was last successfully updated
@@ -98,6 +115,17 @@ class MarketPrice(db.Model):
 # --- Transaction Model ---
 class Transaction(db.Model):
     __tablename__ = 'transaction'
+    __table_args__ = (
+        # Covers the date-range + category GROUP BY used by the budget summary routes
+        db.Index(
+            'ix_tx_date_cat', 'date', 'budget_category',
+            postgresql_where=db.text(
+                "budget_category IS NOT NULL AND budget_category NOT IN ('Income', 'Transfers')"
+            )
+        ),
+        # Matches the default transactions list keyset order (date, id), scanned backwards for DESC
+        db.Index('ix_tx_date_id', 'date', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     # Foreign Key to link transaction to an account in our Account table
@@ -216,3 +244,43 @@ class RecurringExpense(db.Model):
 
     def __repr__(self):
         return f'<RecurringExpense {self.name} ({self.amount}/{self.frequency})>'
+
+# --- Sync Task Model ---
+# Status/result of queued one-shot sync tasks (GET /api/jobs/<job_id>). Kept in the DB so a poll
+# can be answered by any gunicorn worker, not just the one whose scheduler runs the task.
+class SyncTask(db.Model):
+    __tablename__ = 'sync_task'
+
+    job_id = db.Column(db.String(64), primary_key=True)
+    # 'queued', 'running', 'finished' or 'failed'
+    status = db.Column(db.String(16), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)
+    result = db.Column(db.JSON, nullable=True) # JSON body returned by the task
+
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), index=True)
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def to_dict(self):
+        """Returns the pollable status fields of the task."""
+        return {
+            'status': self.status,
+            'status_code': self.status_code,
+            'result': self.result
+        }
+
+    def __repr__(self):
+        return f'<SyncTask {self.job_id}: {self.status}>'
+
+# --- Data Version Model ---
+# One row per tracked table group ('transactions', ...), bumped by statement-level triggers
+# (see the data_version migrations) in the same transaction as the write. Because writers
+# serialize on the row, the counter changes exactly when their rows become visible, so it
+# can key response caches shared across worker processes.
+class DataVersion(db.Model):
+    __tablename__ = 'data_version'
+
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DataVersion {self.name}: {self.version}>'
@@ -1,7 +1,9 @@
 from flask import jsonify, request, current_app # Added request and current_app
+from flask import Response, stream_with_context
 
 # Import plaid client and constants from extensions
-from extensions import db, plaid_products, plaid_country_codes
+from extensions import db, plaid_products, plaid_country_codes, orjson_dumps
+from extensions import budget_summary_cache, budget_summary_cache_lock
 
 # Import Plaid models needed for link token creation
 from plaid.model.link_token_create_request import LinkTokenCreateRequest
@@ -13,27 +15,252 @@ from plaid.model.liabilities_get_request import LiabilitiesGetRequest
 from plaid.exceptions import ApiException
 
 from models import PlaidItem, Account, MarketPrice, Transaction
-from models import UserProfile, RecurringExpense
+from models import UserProfile, RecurringExpense, DataVersion, NON_SPENDING_CATEGORIES
+from jobs import enqueue_background_sync, enqueue_sync_task, get_sync_task
 import datetime
-from sqlalchemy import func
+from sqlalchemy import func, select, tuple_, case, literal_column, and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import joinedload, load_only
 
 # Import SQLAlchemyError for DB error handling
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 
+import base64
+import hashlib
 import decimal
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import MappingProxyType
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
+from decimal import Decimal
+import orjson
+
+# Numeric loan columns editable via PUT /api/accounts/<id>
+LOAN_FIELDS = ('loan_monthly_payment', 'loan_original_amount', 'loan_interest_rate')
+
+# Exact factors converting a recurring amount to its monthly equivalent
+FREQ_FACTOR = {
+    'monthly': Decimal(1),
+    'yearly': Decimal(1) / 12,
+    'quarterly': Decimal(1) / 3,
+    'weekly': Decimal(52) / 12,
+    'biweekly': Decimal(26) / 12,
+}
+
+# Portfolio totals are reported to the cent
+CENTS = Decimal('0.01')
+
+# Map our account types/sources to portfolio categories (read-only, shared across requests)
+TYPE_MAPPING = MappingProxyType({
+    'depository': 'cash',
+    'investment': 'investment',
+    'crypto': 'crypto',
+    'loan': 'loan'
+})
+SOURCE_MAPPING = MappingProxyType({ # To categorize holdings by where they came from
+    'Plaid': 'Bank/Broker (via Plaid)',
+    'PlaidInvestment': 'Investment (via Plaid)',
+    'Coinbase': 'Crypto (via Coinbase)',
+    'Robinhood': 'Investment/Crypto (via Robinhood)', # Combined for now
+    'Manual': 'Manual Entry'
+})
+
+# Prebuilt base SELECT for the transactions list; reusing one construct keeps the
+# compiled-statement cache key stable across requests
+TRANSACTION_ROWS_SELECT = select(*Transaction.__table__.columns)
+
+# Sortable transaction columns: sort_by -> (column, ORDER BY/keyset expression, cursor value type).
+# Keyset comparisons need non-null sort values, so the nullable category sorts NULL as ''.
+TRANSACTION_SORTS = {
+    'date': (Transaction.__table__.c.date, Transaction.__table__.c.date, datetime.date),
+    'name': (Transaction.__table__.c.name, Transaction.__table__.c.name, str),
+    'amount': (Transaction.__table__.c.amount, Transaction.__table__.c.amount, Decimal),
+    'budget_category': (Transaction.__table__.c.budget_category, func.coalesce(Transaction.__table__.c.budget_category, ''), str),
+}
 
 # Helper function for safe float conversion (optional)
 def to_decimal(value, default=decimal.Decimal(0.0)):
     if value is None:
         return default
+    # Fast paths for already-numeric values (Numeric columns come back as Decimal)
+    if isinstance(value, decimal.Decimal):
+        return value
+    if isinstance(value, int):
+        return decimal.Decimal(value)
+    if isinstance(value, float):
+        # repr() gives the shortest round-tripping string, e.g. 0.1 -> Decimal('0.1')
+        return decimal.Decimal(repr(value))
     try:
         return decimal.Decimal(value)
     except (TypeError, ValueError, decimal.InvalidOperation):
         current_app.logger.warning(f"Could not convert value '{value}' to Decimal, using default.")
         return default
 
+# --- Plaid liabilities cache ---
+# Liabilities change at most daily; reuse a response per access token for a few minutes
+_liabilities_cache = TTLCache(maxsize=128, ttl=300)
+
+@cached(_liabilities_cache, key=lambda client, access_token: hashkey(access_token), lock=threading.Lock())
+def fetch_liabilities(client, access_token):
+    """Returns the Plaid liabilities_get response (as a dict) for an access token, cached with a TTL."""
+    return client.liabilities_get(LiabilitiesGetRequest(access_token=access_token)).to_dict()
+
+# --- Plaid enum helper ---
+def plaid_enum_str(value):
+    """Returns the string behind a Plaid enum model (e.g. AccountType), passing str/None through."""
+    if value is None or isinstance(value, str):
+        return value
+    return value.value
+
+def plaid_balance(balances):
+    """Returns a Plaid account's current balance, falling back to available, then 0."""
+    current = balances['current']
+    if current is not None:
+        return current
+    available = balances['available']
+    return available if available is not None else 0.0
+
+# --- Plaid error helper ---
+def plaid_error_code(exc):
+    """Returns the `error_code` from a Plaid ApiException body (JSON string or dict), or None."""
+    body = getattr(exc, 'body', None)
+    if not body:
+        return None
+    if not isinstance(body, dict):
+        try:
+            body = orjson.loads(body)
+        except (orjson.JSONDecodeError, TypeError):
+            return None
+    return body.get('error_code') if isinstance(body, dict) else None
+
+# --- Plaid item fetch (account sync) ---
+def fetch_plaid_item(client, access_token):
+    """
+    Fetches accounts and investment holdings for one Plaid item. Runs on a worker thread,
+    so it only touches the Plaid client; API errors are returned rather than raised.
+    Returns (accounts_response, accounts_error, holdings_response, holdings_error).
+    Holdings are not requested when the accounts call fails.
+    """
+    try:
+        accounts_response = client.accounts_get(AccountsGetRequest(access_token=access_token))
+    except ApiException as e:
+        return None, e, None, None
+    try:
+        holdings_response = client.investments_holdings_get(InvestmentsHoldingsGetRequest(access_token=access_token))
+    except ApiException as e:
+        return accounts_response, None, None, e
+    return accounts_response, None, holdings_response, None
+
+# --- Portfolio overview response cache ---
+# Serialized bodies keyed by the overview's ETag; the key changes whenever a price or
+# account row changes, so entries never need explicit invalidation
+_portfolio_cache = TTLCache(maxsize=16, ttl=300)
+_portfolio_cache_lock = threading.Lock()
+
+# --- Plaid Link token cache ---
+# Link tokens stay valid for ~4 hours; reuse one per user for 10 minutes so page reloads
+# don't each cost a Plaid round trip. Failed calls raise and are never cached.
+_link_token_cache = TTLCache(maxsize=256, ttl=600)
+
+@cached(_link_token_cache, key=lambda client, client_user_id: hashkey(client_user_id), lock=threading.Lock())
+def fetch_link_token(client, client_user_id):
+    """Returns the raw Plaid link_token_create JSON body (bytes) for a user, cached with a TTL."""
+    # Create the main Link Token request object
+    link_request = LinkTokenCreateRequest(
+        user=LinkTokenCreateRequestUser(client_user_id=client_user_id),
+        client_name="finsmar", # Your app's name displayed in Plaid Link
+        products=plaid_products, # From extensions.py (e.g., ['auth', 'transactions'])
+        country_codes=plaid_country_codes, # From extensions.py (e.g., ['US'])
+        language='en'
+        # Optional: Add a webhook URL for real-time updates (more complex setup)
+        # webhook='https://your-publicly-accessible-webhook-url/api/plaid/webhook'
+    )
+    # _preload_content=False skips building the response model; non-2xx still raises ApiException
+    return client.link_token_create(link_request, _preload_content=False).data
+
+# --- Account upsert helper (sync routes) ---
+def upsert_accounts(rows, source, build_set, where=None):
+    """
+    Inserts or updates Account rows for one sync source in a single
+    INSERT ... ON CONFLICT (external_id) DO UPDATE statement.
+    `build_set(excluded)` returns the columns to overwrite on conflict.
+    Rows whose external_id already belongs to another source (or that fail the
+    optional extra `where` guard) are left untouched.
+    Returns (created, updated) counts derived from RETURNING (xmax = 0).
+    """
+    if not rows:
+        return 0, 0
+    guard = Account.source == source
+    if where is not None:
+        guard = and_(guard, where)
+    stmt = pg_insert(Account).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['external_id'],
+        set_={**build_set(stmt.excluded), 'updated_at': func.now()},
+        where=guard
+    ).returning((literal_column('xmax') == 0).label('inserted'))
+    inserted_flags = [row.inserted for row in db.session.execute(stmt)]
+    created = sum(1 for flag in inserted_flags if flag)
+    return created, len(inserted_flags) - created
+
+# --- Data versions ---
+def data_version_expr(name):
+    """SQL expression for a trigger-maintained data_version counter (0 before the first write)."""
+    return func.coalesce(select(DataVersion.version).where(DataVersion.name == name).scalar_subquery(), 0)
+
+def data_version(name):
+    """Current value of a data_version counter."""
+    return db.session.execute(select(data_version_expr(name))).scalar()
+
+# --- Streaming JSON helper ---
+def stream_json_array(rows, format_row, prefix=b'[', suffix=b']', on_complete=None):
+    """
+    Streams an iterable of rows as a JSON array, serializing one row at a time.
+    `rows` should already be executing (e.g. iter(query.yield_per(n))) so DB errors
+    surface in the caller's try block rather than mid-response.
+    If given, `on_complete(body)` receives the full body once the last chunk is sent.
+    """
+    def generate():
+        chunks = []
+        yield prefix
+        chunks.append(prefix)
+        for i, row in enumerate(rows):
+            if i:
+                yield b','
+                chunks.append(b',')
+            chunk = orjson_dumps(format_row(row))
+            yield chunk
+            chunks.append(chunk)
+        yield suffix
+        chunks.append(suffix)
+        if on_complete:
+            on_complete(b''.join(chunks))
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+# --- Keyset pagination cursor helpers ---
+def encode_cursor(sort_value, row_id):
+    """Encodes the (sort value, id) of the last row on a page into an opaque URL-safe token."""
+    raw = orjson.dumps([sort_value, row_id], default=str)
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(token, python_type):
+    """Decodes a cursor token back into a (sort value, id) tuple typed for the sort column."""
+    sort_value, row_id = orjson.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    if sort_value is not None:
+        if python_type is datetime.date:
+            sort_value = datetime.date.fromisoformat(sort_value)
+        elif python_type is datetime.datetime:
+            sort_value = datetime.datetime.fromisoformat(sort_value)
+        elif python_type is Decimal:
+            sort_value = Decimal(str(sort_value))
+    return sort_value, int(row_id)
+
 def register_routes(app):
     """Registers routes with the Flask app."""
+    # Resolve long-lived clients once; init_plaid runs before route registration.
+    # The scheduler is attached after this, so it is read from the app (not the proxy) at call time.
+    plaid_client = app.extensions.get('plaid_client')
 
     @app.route('/')
     def hello_world():
@@ -44,33 +271,20 @@ def register_routes(app):
     def create_link_token():
         """Creates a Plaid Link token."""
         try:
-            client = current_app.extensions['plaid_client']
+            client = plaid_client
+            if client is None:
+                return jsonify({'error': 'Plaid client not initialized'}), 503
             # Define a unique and STABLE identifier for your user.
             # For a single-user local app, a hardcoded string is okay,
             # but it MUST remain the same across sessions for Plaid
             # to recognize the user and manage items correctly.
             client_user_id = 'finsmar-local-user-01' # Example ID
 
-            # Create the user object for the request
-            request_user = LinkTokenCreateRequestUser(client_user_id=client_user_id)
-
-            # Create the main Link Token request object
-            link_request = LinkTokenCreateRequest(
-                user=request_user,
-                client_name="finsmar", # Your app's name displayed in Plaid Link
-                products=plaid_products, # From extensions.py (e.g., ['auth', 'transactions'])
-                country_codes=plaid_country_codes, # From extensions.py (e.g., ['US'])
-                language='en'
-                # Optional: Add a webhook URL for real-time updates (more complex setup)
-                # webhook='https://your-publicly-accessible-webhook-url/api/plaid/webhook'
-            )
-
-            # Make the API call to Plaid
-            current_app.logger.info("Getting here")
-            response = client.link_token_create(link_request)
+            # Make the API call to Plaid (reuses a recently created token for this user)
+            link_token = fetch_link_token(client, client_user_id)
 
-            # Return the link_token to the frontend
-            return jsonify(response.to_dict()) # Convert Plaid response object to dict
+            # Return the link_token to the frontend (Plaid's JSON forwarded as-is)
+            return current_app.response_class(link_token, mimetype='application/json')
 
         except ApiException as e:
             # Log the detailed error from Plaid
@@ -95,7 +309,9 @@ def register_routes(app):
 
         try:
             # Get Plaid client from app context
-            client = current_app.extensions['plaid_client']
+            client = plaid_client
+            if client is None:
+                return jsonify({'error': 'Plaid client not initialized'}), 503
 
             # Create request object for token exchange
             exchange_request = ItemPublicTokenExchangeRequest(public_token=public_token)
@@ -131,26 +347,23 @@ def register_routes(app):
                     db.session.add(new_item)
                     current_app.logger.info(f"Adding new PlaidItem: {item_id}")
 
-                current_app.logger.info("Attempting to flush session...")
-                db.session.flush() # Send pending SQL to DB immediately
-                current_app.logger.info("Session flush successful.")
-
-                # Commit the session to save changes/new item
+                # Commit the session to save changes/new item (commit flushes pending SQL itself)
                 current_app.logger.info("Attempting to commit PlaidItem to database...")
                 db.session.commit()
                 current_app.logger.info("Database commit successfull for Plaid item.")
 
-                 # --- Verification Query ---
-                try:
-                    # Immediately try to query the item we just committed
-                    verify_item = PlaidItem.query.filter_by(item_id=item_id).first()
-                    if verify_item:
-                        current_app.logger.info(f"VERIFIED item {item_id} exists in DB immediately after commit. ID: {verify_item.id}")
-                    else:
-                        # This should NOT happen if commit was truly successful
-                        current_app.logger.error(f"VERIFICATION FAILED: item {item_id} NOT FOUND in DB immediately after commit!")
-                except Exception as verify_e:
-                    current_app.logger.error(f"Error during post-commit verification query: {verify_e}", exc_info=True)
+                 # --- Verification Query (opt-in via VERIFY_PLAID_WRITES; costs an extra SELECT) ---
+                if current_app.config.get('VERIFY_PLAID_WRITES'):
+                    try:
+                        # Immediately try to query the item we just committed
+                        verify_item = PlaidItem.query.filter_by(item_id=item_id).first()
+                        if verify_item:
+                            current_app.logger.info(f"VERIFIED item {item_id} exists in DB immediately after commit. ID: {verify_item.id}")
+                        else:
+                            # This should NOT happen if commit was truly successful
+                            current_app.logger.error(f"VERIFICATION FAILED: item {item_id} NOT FOUND in DB immediately after commit!")
+                    except Exception as verify_e:
+                        current_app.logger.error(f"Error during post-commit verification query: {verify_e}", exc_info=True)
                 # --- End Verification Query ---
 
             except SQLAlchemyError as e:
@@ -171,12 +384,42 @@ def register_routes(app):
              current_app.logger.error(f"Unexpected error exchanging token: {e}", exc_info=True)
              return jsonify({'error': 'Internal server error'}), 500
 
+    # --- Background Sync Tasks ---
+    def queue_sync_task(task, name):
+        """Queues a long-running sync off the request thread and returns 202 with its job id."""
+        scheduler = app.extensions.get('scheduler')
+        if not scheduler or not scheduler.running:
+            return jsonify({'error': 'Scheduler not running'}), 503
+        try:
+            job_id = enqueue_sync_task(current_app._get_current_object(), task, name)
+            current_app.logger.info(f"Queued sync task '{job_id}'.")
+            return jsonify({'job_id': job_id, 'status': 'queued'}), 202
+        except Exception as e:
+            current_app.logger.error(f"Error queueing sync task '{name}': {e}", exc_info=True)
+            return jsonify({'error': 'Failed to queue sync task'}), 500
+
+    @app.route('/api/jobs/<job_id>', methods=['GET'])
+    def get_sync_job(job_id):
+        """Returns the status (queued/running/finished/failed) and result of a queued sync task."""
+        try:
+            task = get_sync_task(job_id)
+        except SQLAlchemyError as db_err:
+            current_app.logger.error(f"Database error reading sync task '{job_id}': {db_err}", exc_info=True)
+            return jsonify({'error': 'Database error'}), 500
+        if task is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'job_id': job_id, **task})
+
     # --- Route for Syncing Plaid Accounts ---
     @app.route('/api/plaid/sync_accounts', methods=['POST'])
+    def queue_plaid_account_sync():
+        """Queues sync_plaid_accounts on the scheduler; poll /api/jobs/<job_id> for the result."""
+        return queue_sync_task(sync_plaid_accounts, 'plaid_accounts_sync')
+
     def sync_plaid_accounts():
         """
         Fetches account AND investment holdings data from Plaid for all stored items
-        and syncs with local DB.
+        and syncs with local DB. Runs as a background task (app context only, no request).
         """
         user_id = 'finsmar-local-user-01'
         accounts_synced_count = 0
@@ -189,162 +432,160 @@ def register_routes(app):
 
         # Overall try block for the sync process
         try:
-            items = PlaidItem.query.filter_by(user_id=user_id).all()
+            # One account sync per user at a time. The lock is transaction-scoped, so it is released
+            # by the commit/rollback below and can't leak onto a pooled connection.
+            locked = db.session.execute(
+                select(func.pg_try_advisory_xact_lock(func.hashtext(f"plaid_sync_accounts:{user_id}")))
+            ).scalar()
+            if not locked:
+                db.session.rollback()
+                return jsonify({'error': 'Plaid account sync already running'}), 409
+
+            # Only the ids and token are used below; skip loading the rest of each row
+            items = PlaidItem.query.options(
+                load_only(PlaidItem.id, PlaidItem.item_id, PlaidItem.access_token)
+            ).filter_by(user_id=user_id).all()
             if not items:
                 return jsonify({'message': 'No Plaid items found to sync.'}), 200
 
-            client = current_app.extensions['plaid_client']
+            client = plaid_client
+            if client is None:
+                return jsonify({'error': 'Plaid client not initialized'}), 503
 
-            for item in items:
-                current_app.logger.info(f"--- Processing Plaid Item ID: {item.item_id} ---")
-                item_fetch_successful = True # Flag for this item
+            # Plaid calls are I/O-bound: fetch every item concurrently, then merge each result into
+            # the DB on this thread as it completes (the session is not thread-safe)
+            with ThreadPoolExecutor(max_workers=min(8, len(items))) as executor:
+                futures = {executor.submit(fetch_plaid_item, client, item.access_token): item for item in items}
 
-                # === 1. Fetch Basic Account Data ===
-                try:
-                    get_request = AccountsGetRequest(access_token=item.access_token)
-                    accounts_response = client.accounts_get(get_request)
-                    plaid_accounts = accounts_response['accounts']
-
-                    for plaid_account in plaid_accounts:
-                        plaid_account_id = plaid_account['account_id']
-                        account = Account.query.filter_by(external_id=plaid_account_id).first() # Filter by source too
-                        current_app.logger.info(f"Processing current acount: {plaid_account_id}")
-
-                        plaid_type_obj = plaid_account['type']
-                        plaid_subtype_obj = plaid_account['subtype']
-
-                        account_type_str = plaid_type_obj.value if hasattr(plaid_type_obj, 'value') else str(plaid_type_obj)
-                        account_subtype_str = plaid_subtype_obj.value if hasattr(plaid_subtype_obj, 'value') else str(plaid_subtype_obj)
-                        if plaid_subtype_obj == 'None': account_subtype_str = None
-
-                        balance = plaid_account['balances']['current']
-                        if balance is None: balance = plaid_account['balances']['available']
-                        balance = balance if balance is not None else 0.0
-
-                        if account: # Update depository/loan/credit accounts
-                            if account.account_type != 'investment': # Avoid overwriting investment accounts managed below
-                                account.name = plaid_account['name']
-                                account.balance = balance
-                                # Don't sync type/subtype typically unless necessary
-                                # account.account_type = plaid_account['type']
-                                # account.account_subtype = plaid_account['subtype']
-                                if account.plaid_item_id is None:
-                                    account.plaid_item_id = item.id
-                                accounts_synced_count += 1
-                                current_app.logger.debug(f"Updating Plaid account: {account.name} (ID: {account.id}), Bal: {balance}")
-                        else: # Create depository/loan/credit accounts
-                             if plaid_account['type'] != 'investment': # Only create non-investment here
-                                new_account = Account(
-                                    external_id=plaid_account_id,
-                                    name=plaid_account['name'],
-                                    source='Plaid',
-                                    plaid_item_id = item.id,
-                                    account_type=account_type_str,
-                                    account_subtype=account_subtype_str,
-                                    balance=balance )
-                                db.session.add(new_account)
-                                accounts_created_count += 1
-                                current_app.logger.info(f"Creating Plaid account: {new_account.name} (Plaid ID: {plaid_account_id}), Bal: {balance}")
-
-                except ApiException as e:
-                    item_fetch_successful = False
-                    items_failed_count += 1
-                    current_app.logger.error(f"Plaid API error fetching accounts for Item {item.item_id}: {getattr(e, 'body', e)}", exc_info=True)
-                    if getattr(e, 'body', None): # Check if error body exists
-                         error_data = {}
-                         try: # Try parsing error body
-                             if isinstance(e.body, str): error_data = json.loads(e.body)
-                             elif isinstance(e.body, dict): error_data = e.body
-                         except: pass
-                         if error_data.get('error_code') == 'ITEM_LOGIN_REQUIRED':
-                             current_app.logger.warning(f"Item {item.item_id} requires re-link.")
-                             items_requiring_relink.append(item.item_id)
-                             continue # Skip to next item if relink needed
+                for future in as_completed(futures):
+                    item = futures[future]
+                    accounts_response, accounts_error, holdings_response, holdings_error = future.result()
+                    current_app.logger.info(f"--- Processing Plaid Item ID: {item.item_id} ---")
+                    item_fetch_successful = True # Flag for this item
 
-                # === 2. Fetch Investment Holdings (if basic account fetch succeeded) ===
-                if item_fetch_successful: # Only try if accounts_get didn't fail badly
+                    # === 1. Fetch Basic Account Data ===
                     try:
-                        holdings_request = InvestmentsHoldingsGetRequest(access_token=item.access_token)
-                        holdings_response = client.investments_holdings_get(holdings_request)
-                        holdings = holdings_response.get('holdings', [])
-                        securities = holdings_response.get('securities', [])
-                        # Create a lookup map for security details
-                        security_map = {s['security_id']: s for s in securities}
-
-                        current_app.logger.info(f"Fetched {len(holdings)} holdings for Item {item.item_id}.")
-
-                        processed_holding_ids = set() # Track holdings processed in this run for this item
-
-                        for holding in holdings:
-                            security_id = holding['security_id']
-                            security_info = security_map.get(security_id)
-                            processed_holding_ids.add(security_id)
-
-                            if not security_info:
-                                current_app.logger.warning(f"Security info not found for security_id: {security_id}")
-                                continue
-
-                            ticker = security_info.get('ticker_symbol', f"SEC_ID_{security_id}")
-                            if ticker is None: ticker = 'rando'
-                            name = security_info.get('name', 'Unknown Security')
-                            quantity = holding['quantity']
-
-                            # Treat each security holding as an "Account" in our model
-                            account = Account.query.filter_by(external_id=security_id).first()
-
-                            if account:
-                                # Update holding quantity
-                                account.balance = quantity # Store quantity in balance
-                                account.name = ticker # Ensure name is up-to-date
-                                if account.plaid_item_id is None:
-                                    account.plaid_item_id = item.id
-                                holdings_synced_count += 1
-                                current_app.logger.debug(f"Updating Plaid holding: {ticker} (ID: {account.id}), Qty: {quantity}")
-                            else:
-                                # Create new holding account
-                                new_account = Account(
-                                    external_id=security_id, # Use Plaid security_id
-                                    name=ticker,
-                                    plaid_item_id = item.id,
-                                    source='PlaidInvestment', # Differentiate source
-                                    account_type='investment',
-                                    account_subtype=name, # Use security name as subtype
-                                    balance=quantity # Store quantity
-                                )
-                                db.session.add(new_account)
-                                holdings_created_count += 1
-                                current_app.logger.info(f"Creating Plaid holding: {ticker} (Sec ID: {security_id}), Qty: {quantity}")
-
-                        # Optional: Zero out holdings previously synced but no longer present
-                        # stale_holdings = Account.query.filter(
-                        #    Account.source == 'PlaidInvestment',
-                        #    Account.plaid_item_id == item.id, # Requires linking Account to PlaidItem
-                        #    ~Account.external_id.in_(processed_holding_ids)
-                        # ).all()
-                        # for stale in stale_holdings: stale.balance = 0.0
+                        if accounts_error: raise accounts_error
+                        plaid_accounts = accounts_response['accounts']
+
+                        # Build one row per non-investment account (holdings are synced below), keyed by
+                        # Plaid account_id so a repeated id collapses to its last entry
+                        account_rows = {}
+                        for plaid_account in plaid_accounts:
+                            plaid_account_id = plaid_account['account_id']
+                            current_app.logger.info(f"Processing current acount: {plaid_account_id}")
+                            account_type_str = plaid_enum_str(plaid_account['type'])
+                            account_subtype_str = plaid_enum_str(plaid_account['subtype'])
+                            if account_type_str == 'investment': continue
+
+                            account_rows[plaid_account_id] = {
+                                'external_id': plaid_account_id,
+                                'name': plaid_account['name'],
+                                'source': 'Plaid',
+                                'plaid_item_id': item.id,
+                                'account_type': account_type_str,
+                                'account_subtype': account_subtype_str,
+                                'balance': plaid_balance(plaid_account['balances'])
+                            }
+
+                        # Upsert depository/loan/credit accounts in one statement. Type/subtype are not
+                        # re-synced, and investment accounts managed below are never overwritten.
+                        created, updated = upsert_accounts(
+                            list(account_rows.values()), 'Plaid',
+                            lambda excluded: {
+                                'name': excluded.name,
+                                'balance': excluded.balance,
+                                'plaid_item_id': func.coalesce(Account.plaid_item_id, excluded.plaid_item_id)
+                            },
+                            where=(Account.account_type != 'investment')
+                        )
+                        accounts_created_count += created
+                        accounts_synced_count += updated
+                        current_app.logger.info(f"Plaid accounts upsert for Item {item.item_id}: created {created}, updated {updated}")
 
                     except ApiException as e:
-                         # Holdings might not be available for this item type or access token scope
-                         if e.body and 'error_code' in e.body:
-                             error_data = {}
-                             try:
-                                 if isinstance(e.body, str): error_data = json.loads(e.body)
-                                 elif isinstance(e.body, dict): error_data = e.body
-                             except: pass
+                        item_fetch_successful = False
+                        items_failed_count += 1
+                        current_app.logger.error(f"Plaid API error fetching accounts for Item {item.item_id}: {getattr(e, 'body', e)}", exc_info=True)
+                        if plaid_error_code(e) == 'ITEM_LOGIN_REQUIRED':
+                             current_app.logger.warning(f"Item {item.item_id} requires re-link.")
+                             items_requiring_relink.append(item.item_id)
+                             continue # Skip to next item if relink needed
+
+                    # === 2. Fetch Investment Holdings (if basic account fetch succeeded) ===
+                    if item_fetch_successful: # Only try if accounts_get didn't fail badly
+                        try:
+                            if holdings_error: raise holdings_error
+                            holdings = holdings_response.get('holdings', [])
+                            securities = holdings_response.get('securities', [])
+                            # Create a lookup map for security details
+                            security_map = {s['security_id']: s for s in securities}
+
+                            current_app.logger.info(f"Fetched {len(holdings)} holdings for Item {item.item_id}.")
+
+                            processed_holding_ids = {h['security_id'] for h in holdings} # Holdings present in this run for this item
+                            holding_rows = {} # Keyed by security_id; a repeated security keeps its last quantity
+
+                            for holding in holdings:
+                                security_id = holding['security_id']
+                                security_info = security_map.get(security_id)
+
+                                if not security_info:
+                                    current_app.logger.warning(f"Security info not found for security_id: {security_id}")
+                                    continue
+
+                                ticker = security_info.get('ticker_symbol', f"SEC_ID_{security_id}")
+                                if ticker is None: ticker = 'rando'
+                                name = security_info.get('name', 'Unknown Security')
+                                quantity = holding['quantity']
+
+                                # Treat each security holding as an "Account" in our model
+                                holding_rows[security_id] = {
+                                    'external_id': security_id, # Use Plaid security_id
+                                    'name': ticker,
+                                    'plaid_item_id': item.id,
+                                    'source': 'PlaidInvestment', # Differentiate source
+                                    'account_type': 'investment',
+                                    'account_subtype': name, # Use security name as subtype
+                                    'balance': quantity # Store quantity
+                                }
+
+                            # Upsert all holdings for this item in one statement (quantity and ticker refreshed)
+                            created, updated = upsert_accounts(
+                                list(holding_rows.values()), 'PlaidInvestment',
+                                lambda excluded: {
+                                    'balance': excluded.balance,
+                                    'name': excluded.name,
+                                    'plaid_item_id': func.coalesce(Account.plaid_item_id, excluded.plaid_item_id)
+                                }
+                            )
+                            holdings_created_count += created
+                            holdings_synced_count += updated
+                            current_app.logger.info(f"Plaid holdings upsert for Item {item.item_id}: created {created}, updated {updated}")
+
+                            # Optional: Zero out holdings previously synced but no longer present (one UPDATE)
+                            # db.session.execute(
+                            #    update(Account).where(
+                            #        Account.source == 'PlaidInvestment',
+                            #        Account.plaid_item_id == item.id,
+                            #        Account.external_id.notin_(processed_holding_ids)
+                            #    ).values(balance=0)
+                            # )
+
+                        except ApiException as e:
+                             # Holdings might not be available for this item type or access token scope
                              # Common error if 'investments' product not consented or not supported
-                             if error_data.get('error_code') in ['PRODUCT_NOT_READY', 'PRODUCTS_NOT_SUPPORTED', 'ITEM_NOT_SUPPORTED']:
+                             if plaid_error_code(e) in ['PRODUCT_NOT_READY', 'PRODUCTS_NOT_SUPPORTED', 'ITEM_NOT_SUPPORTED']:
                                  current_app.logger.info(f"Investments product not available for Item {item.item_id}. Skipping holdings.")
                              else:
                                  # Log other Plaid API errors for holdings
-                                 current_app.logger.error(f"Plaid API error fetching holdings for Item {item.item_id}: {error_data}", exc_info=True)
-                         else:
-                             current_app.logger.error(f"Plaid API error fetching holdings for Item {item.item_id}: {e}", exc_info=True)
-                         # Decide if this constitutes a full item failure
-                         # item_fetch_successful = False # Optional: Mark item as failed if holdings are critical
-                         # items_failed_count += 1
+                                 current_app.logger.error(f"Plaid API error fetching holdings for Item {item.item_id}: {getattr(e, 'body', e)}", exc_info=True)
+                             # Decide if this constitutes a full item failure
+                             # item_fetch_successful = False # Optional: Mark item as failed if holdings are critical
+                             # items_failed_count += 1
 
-                if item_fetch_successful:
-                     items_processed_count += 1
+                    if item_fetch_successful:
+                         items_processed_count += 1
 
             # --- End of Item Loop ---
 
@@ -530,8 +771,13 @@ def register_routes(app):
     def get_recurring_expenses():
         """Gets all active recurring expenses."""
         try:
-            expenses = RecurringExpense.query.filter_by(is_active=True).order_by(RecurringExpense.name).all()
-            return jsonify([e.to_dict() for e in expenses])
+            # Plain column rows (keys match RecurringExpense.to_dict()); the JSON provider handles Decimal/date
+            expenses = db.session.execute(
+                select(*RecurringExpense.__table__.columns)
+                .where(RecurringExpense.is_active.is_(True))
+                .order_by(RecurringExpense.name)
+            ).mappings().all()
+            return jsonify([dict(e) for e in expenses])
         except Exception as e:
             current_app.logger.error(f"Error fetching recurring expenses: {e}", exc_info=True)
             return jsonify({"error": "Internal server error"}), 500
@@ -633,34 +879,22 @@ def register_routes(app):
         if not data:
             return jsonify({"error": "Missing request body"}), 400
 
-        updated_fields = []
+        # Work out which fields apply before touching the ORM object, so an empty
+        # update never opens a transaction or dirties the row
+        updatable = ('name',) # Add other general fields if needed (e.g., notes?)
+        if account.account_type == 'loan': # Only update loan fields for loan accounts
+            updatable += LOAN_FIELDS
+        updated_fields = [field for field in updatable if field in data]
+        if not updated_fields:
+             return jsonify({"message": "No valid fields provided for update"}), 400
+
         try:
-            # Allow updating specific fields if they are in the request
-            if 'name' in data:
-                account.name = data['name']
-                updated_fields.append('name')
-            # Add other general fields if needed (e.g., notes?)
-
-            # --- Update Loan Specific Fields ---
-            if account.account_type == 'loan': # Only update loan fields for loan accounts
-                if 'loan_monthly_payment' in data:
-                    payment_str = data['loan_monthly_payment']
-                    # Allow setting to null/empty or a valid number
-                    account.loan_monthly_payment = decimal.Decimal(payment_str) if payment_str else None
-                    updated_fields.append('loan_monthly_payment')
-                if 'loan_original_amount' in data:
-                    orig_str = data['loan_original_amount']
-                    account.loan_original_amount = decimal.Decimal(orig_str) if orig_str else None
-                    updated_fields.append('loan_original_amount')
-                if 'loan_interest_rate' in data:
-                     rate_str = data['loan_interest_rate']
-                     # Store rate as decimal (e.g., 5% stored as 0.05)
-                     account.loan_interest_rate = decimal.Decimal(rate_str) if rate_str else None
-                     updated_fields.append('loan_interest_rate')
-            # --------------------------------
-
-            if not updated_fields:
-                 return jsonify({"message": "No valid fields provided for update"}), 400
+            for field in updated_fields:
+                value = data[field]
+                if field in LOAN_FIELDS:
+                    # Allow setting to null/empty or a valid number (rate stored as decimal, e.g. 0.05)
+                    value = Decimal(value) if value else None
+                setattr(account, field, value)
 
             db.session.commit()
             current_app.logger.info(f"Updated fields {updated_fields} for Account ID: {account_id}")
@@ -686,7 +920,8 @@ def register_routes(app):
         For Plaid-linked accounts, fetches from Plaid API.
         For manually added accounts, returns the stored rate from the database.
         """
-        account = Account.query.get_or_404(account_id)
+        # Load the linked PlaidItem in the same query instead of a second lazy load
+        account = Account.query.options(joinedload(Account.plaid_item)).get_or_404(account_id)
         current_app.logger.info(f"Getting rate for account {account_id}")
         
         # Check if this is a loan account
@@ -720,10 +955,11 @@ def register_routes(app):
             return jsonify({"error": "Account is missing Plaid external ID"}), 400
 
         try:
-            client = current_app.extensions['plaid_client']
-            request = LiabilitiesGetRequest(access_token=plaid_item.access_token).to_dict()
-            response = client.liabilities_get(request).to_dict()
-            current_app.logger.info(f"Resonse: {response} Request: {request}")
+            client = plaid_client
+            if client is None:
+                return jsonify({'error': 'Plaid client not initialized'}), 503
+            response = fetch_liabilities(client, access_token)
+            current_app.logger.info(f"Resonse: {response}")
 
             rate = None
             plaid_account_id_to_match = account.external_id
@@ -733,43 +969,26 @@ def register_routes(app):
             current_app.logger.info(f"Type of liabilities_data: {type(liabilities_data)}")
             if liabilities_data and isinstance(liabilities_data, dict):
                 current_app.logger.info(f"Processing liabilities data for Account {account_id}")
-                # Now we can safely access mortgage, student, credit keys
-
-                # Check mortgages
-                mortgages = liabilities_data.get('mortgage', [])
-                current_app.logger.info(f"mortgages: {mortgages}")
-                if mortgages is not None:
-                    for mortgage in liabilities_data.get('mortgage', []): # Use .get() here too
-                        if mortgage.get('account_id') == plaid_account_id_to_match:
-                            rate_percent = mortgage.get('interest_rate', {}).get('percentage')
-                            if rate_percent is not None: rate = decimal.Decimal(rate_percent) / 100
-                            break # Found rate, exit mortgage loop
-
-                # Check student loans if not found yet
-                if rate is None:
-                    student_loans = liabilities_data.get('student', [])
-                    if student_loans is not None:
-                        for student in liabilities_data.get('student', []): # Use .get()
-                            if student.get('account_id') == plaid_account_id_to_match:
-                                rate_percent = student.get('interest_rate_percentage')
-                                if rate_percent is not None: rate = decimal.Decimal(rate_percent) / 100
-                                break # Found rate, exit student loop
-
-                # Check credit cards if not found yet
-                if rate is None:
-                    credits = liabilities_data.get('credit', [])
-                    if credits is not None:
-                        for credit in liabilities_data.get('credit', []): # Use .get()
-                            if credit.get('account_id') == plaid_account_id_to_match:
-                                # ... (logic to extract APR from credit['aprs']) ...
-                                aprs = credit.get('aprs', [])
-                                purchase_apr_info = next((apr for apr in aprs if apr.get('apr_type') == 'purchase_apr'), None)
-                                if purchase_apr_info:
-                                    rate_percent = purchase_apr_info.get('apr_percentage')
-                                elif aprs: rate_percent = aprs[0].get('apr_percentage')
-                                else: rate_percent = None
-                                if rate_percent is not None: rate = decimal.Decimal(rate_percent) / 100
-                                break # Found rate (or determined none available), exit credit loop
+                # Index every liability by account_id once, then do a single lookup
+                # (setdefault keeps the mortgage -> student -> credit precedence)
+                liability_index = {}
+                for liability_type in ('mortgage', 'student', 'credit'):
+                    for payload in liabilities_data.get(liability_type) or []:
+                        liability_index.setdefault(payload.get('account_id'), (liability_type, payload))
+
+                liability_type, payload = liability_index.get(plaid_account_id_to_match, (None, None))
+                rate_percent = None
+                if liability_type == 'mortgage':
+                    rate_percent = (payload.get('interest_rate') or {}).get('percentage')
+                elif liability_type == 'student':
+                    rate_percent = payload.get('interest_rate_percentage')
+                elif liability_type == 'credit':
+                    aprs = payload.get('aprs') or []
+                    purchase_apr_info = next((apr for apr in aprs if apr.get('apr_type') == 'purchase_apr'), None)
+                    if purchase_apr_info:
+                        rate_percent = purchase_apr_info.get('apr_percentage')
+                    elif aprs: rate_percent = aprs[0].get('apr_percentage')
+                if rate_percent is not None: rate = decimal.Decimal(rate_percent) / 100
             else:
                 # Log if the 'liabilities' key itself was missing or null
                 current_app.logger.warning(f"Plaid response did not contain valid 'liabilities' data for Item {plaid_item.item_id}")
@@ -808,7 +1027,7 @@ def register_routes(app):
         Attempts to fetch detailed liability info (APR, balances, due dates)
         for a specific credit card account via Plaid.
         """
-        account = Account.query.get_or_404(account_id)
+        account = Account.query.options(joinedload(Account.plaid_item)).get_or_404(account_id)
         if account.account_type != 'credit':
             return jsonify({"error": "Account is not a credit card account"}), 400
 
@@ -824,9 +1043,10 @@ def register_routes(app):
              return jsonify({"error": "Account is missing Plaid external ID"}), 400
 
         try:
-            client = current_app.extensions['plaid_client']
-            request = LiabilitiesGetRequest(access_token=access_token)
-            response = client.liabilities_get(request).to_dict()
+            client = plaid_client
+            if client is None:
+                return jsonify({'error': 'Plaid client not initialized'}), 503
+            response = fetch_liabilities(client, access_token)
 
             card_details = None
             if response.get('liabilities') and response['liabilities'].get('credit'):
@@ -864,12 +1084,7 @@ def register_routes(app):
         except ApiException as e:
             # Check for specific error codes if needed (e.g., PRODUCT_NOT_READY)
              body = getattr(e, 'body', None)
-             error_code = None
-             if body:
-                  try:
-                      error_data = json.loads(body) if isinstance(body, str) else body
-                      error_code = error_data.get('error_code')
-                  except: pass # Ignore parsing errors
+             error_code = plaid_error_code(e)
 
              if error_code == 'PRODUCT_NOT_READY':
                  return jsonify({"error": "Liabilities data not ready for this item. Try again later."}), 503
@@ -892,39 +1107,48 @@ def register_routes(app):
         current_app.logger.info(f"Querying summary for {year}, {month}")
 
         try:
+            # Keyed on the transactions data version, so a sync committed by any worker
+            # (not just this process) moves readers onto a fresh entry
+            cache_key = (year, month, data_version('transactions'))
+            with budget_summary_cache_lock:
+                cached_body = budget_summary_cache.get(cache_key)
+            if cached_body is not None:
+                return Response(cached_body, mimetype='application/json')
+
             # Calculate start and end date for the requested month
             start_date = datetime.date(year, month, 1)
-            # Go to the first day of the *next* month, then subtract one day? No, just filter < first day of next month
-            if month == 12:
-                end_date_exclusive = datetime.date(year + 1, 1, 1)
-            else:
-                end_date_exclusive = datetime.date(year, month + 1, 1)
+            # Filter < first day of the next month (December rolls over into January)
+            end_date_exclusive = datetime.date(year + month // 12, month % 12 + 1, 1)
 
             # Query transactions: filter by date, exclude positive amounts/income categories
             # Note: Plaid amounts are signed (+ income, - expense)
-            summary_query = db.session.query(
+            summary_query = select(
                 Transaction.budget_category,
                 func.sum(Transaction.amount).label('total_amount')
-            ).filter(
+            ).where(
                 Transaction.date >= start_date,
                 Transaction.date < end_date_exclusive,
                 # Transaction.amount < 0, # Only include expenses (negative amounts)
-                # Optionally filter out specific categories like 'Transfers' if needed
-                Transaction.budget_category != 'Income',
-                Transaction.budget_category != 'Transfers'
+                # Predicates mirror the ix_tx_date_cat partial index so the planner can use it
+                Transaction.budget_category.isnot(None),
+                Transaction.budget_category.notin_(NON_SPENDING_CATEGORIES)
             ).group_by(
                 Transaction.budget_category
             ).order_by(
                 func.sum(Transaction.amount) # Order by lowest amount (most negative) first
-            ).all()
+            )
 
-            # Format the results
-            summary_data = [
-                {"category": category if category else "Uncategorized", "total": float(total)}
-                for category, total in summary_query
-            ]
+            def cache_body(body):
+                with budget_summary_cache_lock:
+                    budget_summary_cache[cache_key] = body
 
-            return jsonify(summary_data)
+            # Stream Core rows from a server-side cursor straight into the response
+            rows = iter(db.session.execute(summary_query.execution_options(yield_per=100)))
+            return stream_json_array(
+                rows,
+                lambda row: {"category": row[0] if row[0] else "Uncategorized", "total": row[1]},
+                on_complete=cache_body
+            )
 
         except ValueError:
              return jsonify({"error": "Invalid year or month provided"}), 400
@@ -946,22 +1170,12 @@ def register_routes(app):
             total_recurring_monthly = decimal.Decimal(0.0)
             active_expenses = RecurringExpense.query.filter_by(is_active=True).all()
             for expense in active_expenses:
-                amount = to_decimal(expense.amount)
-                frequency = expense.frequency.lower() if expense.frequency else 'monthly'
-
-                if frequency == 'monthly':
-                    total_recurring_monthly += amount
-                elif frequency == 'yearly':
-                    total_recurring_monthly += amount / 12
-                elif frequency == 'quarterly':
-                    total_recurring_monthly += amount / 3
-                elif frequency == 'weekly':
-                    # Approximate monthly amount for weekly expenses
-                    total_recurring_monthly += amount * decimal.Decimal(52.0 / 12.0)
-                # Add other frequencies if needed (e.g., bi-weekly: amount * (26.0 / 12.0))
-                else:
-                    current_app.logger.warning(f"Unknown frequency '{frequency}' for recurring expense '{expense.name}'. Treating as monthly.")
-                    total_recurring_monthly += amount # Default to monthly if frequency unknown
+                # Frequencies are lower-cased when expenses are created/updated
+                factor = FREQ_FACTOR.get(expense.frequency or 'monthly')
+                if factor is None:
+                    current_app.logger.warning(f"Unknown frequency '{expense.frequency}' for recurring expense '{expense.name}'. Treating as monthly.")
+                    factor = FREQ_FACTOR['monthly'] # Default to monthly if frequency unknown
+                total_recurring_monthly += to_decimal(expense.amount) * factor
 
             # 3. Calculate Total Monthly Loan Payments
             total_loan_payments_monthly = decimal.Decimal(0.0)
@@ -972,12 +1186,12 @@ def register_routes(app):
             # 4. Perform Calculation
             estimated_available = monthly_salary - total_recurring_monthly - total_loan_payments_monthly
 
-            # 5. Prepare Response Data (convert Decimals to float for JSON)
+            # 5. Prepare Response Data (Decimals are written as JSON numbers by the JSON provider)
             result_data = {
-                'monthly_salary_estimate': float(monthly_salary),
-                'total_recurring_expenses_monthly': float(total_recurring_monthly),
-                'total_loan_payments_monthly': float(total_loan_payments_monthly),
-                'estimated_available_monthly': float(estimated_available),
+                'monthly_salary_estimate': monthly_salary,
+                'total_recurring_expenses_monthly': total_recurring_monthly,
+                'total_loan_payments_monthly': total_loan_payments_monthly,
+                'estimated_available_monthly': estimated_available,
                 'calculation_timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat()
             }
 
@@ -996,15 +1210,14 @@ def register_routes(app):
         try:
             # --- Base Query ---
             # Query category and sum, filter for expenses, exclude Income/Transfers
-            query = db.session.query(
+            query = select(
                 Transaction.budget_category,
                 func.sum(Transaction.amount).label('total_amount')
-            ).filter(
+            ).where(
                 # Transaction.amount < 0,
                 Transaction.budget_category.isnot(None),
                 Transaction.budget_category != '',
-                Transaction.budget_category != 'Income',
-                Transaction.budget_category != 'Transfers'
+                Transaction.budget_category.notin_(NON_SPENDING_CATEGORIES)
             )
 
             # --- Apply Filters (mirroring /api/transactions) ---
@@ -1016,33 +1229,32 @@ def register_routes(app):
             if start_date_str:
                 try:
                     start_date = datetime.date.fromisoformat(start_date_str)
-                    query = query.filter(Transaction.date >= start_date)
+                    query = query.where(Transaction.date >= start_date)
                 except ValueError: return jsonify({"error": "Invalid start_date format"}), 400
             if end_date_str:
                 try:
                     end_date = datetime.date.fromisoformat(end_date_str)
-                    query = query.filter(Transaction.date <= end_date)
+                    query = query.where(Transaction.date <= end_date)
                 except ValueError: return jsonify({"error": "Invalid end_date format"}), 400
             if category:
-                 query = query.filter(Transaction.budget_category == category)
+                 query = query.where(Transaction.budget_category == category)
             if account_db_id:
-                 query = query.filter(Transaction.account_db_id == account_db_id)
+                 query = query.where(Transaction.account_db_id == account_db_id)
 
             # --- Group and Execute ---
             summary_query = query.group_by(
                 Transaction.budget_category
             ).order_by(
                 func.sum(Transaction.amount) # Order by most negative first
-            ).all()
-
-            # Format the results
-            summary_data = [
-                {"category": cat if cat else "Uncategorized", "total": float(total)}
-                for cat, total in summary_query
-            ]
+            )
 
-            # Return just the summary data
-            return jsonify({"summary": summary_data})
+            # Stream Core rows from a server-side cursor, wrapped as {"summary": [...]}
+            rows = iter(db.session.execute(summary_query.execution_options(yield_per=100)))
+            return stream_json_array(
+                rows,
+                lambda row: {"category": row[0] if row[0] else "Uncategorized", "total": row[1]},
+                prefix=b'{"summary":[', suffix=b']}'
+            )
 
         except Exception as e:
             current_app.logger.error(f"Error generating filtered transaction summary: {e}", exc_info=True)
@@ -1051,16 +1263,20 @@ def register_routes(app):
     # --- Transactions List Route ---
     @app.route('/api/transactions', methods=['GET'])
     def get_transactions():
-        """Returns a paginated list of transactions with filtering/sorting."""
+        """
+        Returns a keyset-paginated list of transactions with filtering/sorting.
+        Pass the returned `next_cursor` back as `cursor` to fetch the following page.
+        """
         try:
             # --- Pagination ---
-            page = request.args.get('page', 1, type=int)
             per_page = request.args.get('per_page', 50, type=int)
-            # Limit per_page to a reasonable max
-            per_page = min(per_page, 200)
+            # Limit per_page to a reasonable range
+            per_page = max(1, min(per_page, 200))
+            cursor = request.args.get('cursor')
 
             # --- Base Query ---
-            query = Transaction.query
+            # Select plain columns (keys match Transaction.to_dict()) so rows skip ORM hydration
+            query = TRANSACTION_ROWS_SELECT
 
             # --- Filtering ---
             start_date_str = request.args.get('start_date')
@@ -1073,54 +1289,69 @@ def register_routes(app):
             if start_date_str:
                 try:
                     start_date = datetime.date.fromisoformat(start_date_str)
-                    query = query.filter(Transaction.date >= start_date)
+                    query = query.where(Transaction.date >= start_date)
                 except ValueError:
                     return jsonify({"error": "Invalid start_date format (YYYY-MM-DD)"}), 400
             if end_date_str:
                 try:
                     end_date = datetime.date.fromisoformat(end_date_str)
-                    query = query.filter(Transaction.date <= end_date)
+                    query = query.where(Transaction.date <= end_date)
                 except ValueError:
                     return jsonify({"error": "Invalid end_date format (YYYY-MM-DD)"}), 400
             if category:
-                 query = query.filter(Transaction.budget_category == category)
+                 query = query.where(Transaction.budget_category == category)
             if account_db_id:
-                 query = query.filter(Transaction.account_db_id == account_db_id)
+                 query = query.where(Transaction.account_db_id == account_db_id)
 
             # --- Sorting ---
             sort_by = request.args.get('sort_by', 'date') # Default sort by date
             sort_dir = request.args.get('sort_dir', 'desc') # Default sort descending
 
-            sort_column = getattr(Transaction, sort_by, None)
-            if sort_column is None: # Default to date if invalid column provided
-                sort_column = Transaction.date
+            if sort_by not in TRANSACTION_SORTS: # Default to date if unsupported column provided
                 sort_by = 'date' # Reset for logging
+            sort_column, sort_expr, python_type = TRANSACTION_SORTS[sort_by]
 
-            if sort_dir.lower() == 'asc':
-                query = query.order_by(sort_column.asc())
+            # Tie-break on id so (sort value, id) is a unique, stable position
+            ascending = sort_dir.lower() == 'asc'
+            if cursor:
+                try:
+                    cursor_value, cursor_id = decode_cursor(cursor, python_type)
+                except (ValueError, TypeError, orjson.JSONDecodeError, decimal.InvalidOperation):
+                    return jsonify({"error": "Invalid cursor"}), 400
+                position = tuple_(sort_expr, Transaction.id)
+                query = query.where(position > (cursor_value, cursor_id) if ascending else position < (cursor_value, cursor_id))
+            if ascending:
+                query = query.order_by(sort_expr.asc(), Transaction.id.asc())
             else:
-                query = query.order_by(sort_column.desc()) # Default desc
+                query = query.order_by(sort_expr.desc(), Transaction.id.desc()) # Default desc
 
             # --- Execute Query ---
-            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-            transactions = pagination.items
-            total_items = pagination.total
-            total_pages = pagination.pages
+            # Fetch one extra row to learn whether another page exists (no COUNT(*) needed)
+            rows = db.session.execute(query.limit(per_page + 1)).mappings().all()
+            has_more = len(rows) > per_page
+            rows = rows[:per_page]
+            next_cursor = None
+            if has_more:
+                last = rows[-1]
+                last_value = last[sort_column.name]
+                if last_value is None: last_value = ''
+                next_cursor = encode_cursor(last_value, last['id'])
 
             return jsonify({
-                'transactions': [t.to_dict() for t in transactions],
+                # Row mappings go straight to orjson (Decimal/date handled by the JSON provider)
+                'transactions': [dict(row) for row in rows],
                 'pagination': {
-                    'page': page,
                     'per_page': per_page,
-                    'total_items': total_items,
-                    'total_pages': total_pages
+                    'cursor': cursor,
+                    'next_cursor': next_cursor,
+                    'has_more': has_more
                 },
                 'filters': { # Echo back applied filters
                     'start_date': start_date_str, 'end_date': end_date_str,
                     'category': category, 'account_id': account_db_id
                 },
                 'sorting': {
-                    'sort_by': sort_by, 'sort_dir': sort_dir.lower()
+                    'sort_by': sort_by, 'sort_dir': 'asc' if ascending else 'desc'
                 }
             })
 
@@ -1130,8 +1361,12 @@ def register_routes(app):
 
     # --- Add Robinhood Sync Route ---
     @app.route('/api/robinhood/sync', methods=['POST'])
+    def queue_robinhood_sync():
+        """Queues sync_robinhood_portfolio on the scheduler; poll /api/jobs/<job_id> for the result."""
+        return queue_sync_task(sync_robinhood_portfolio, 'robinhood_sync')
+
     def sync_robinhood_portfolio():
-        """Fetches positions from Robinhood and syncs with local DB."""
+        """Fetches positions from Robinhood and syncs with local DB. Runs as a background task."""
         if 'robinhood_client' not in current_app.extensions:
              return jsonify({'error': 'Robinhood service not initialized. Check API keys.'}), 503 # Service Unavailable
 
@@ -1145,6 +1380,7 @@ def register_routes(app):
                 return jsonify({'message': 'No positions found or failed to fetch from Robinhood.'}), 200
 
             processed_ids = set() # Keep track of processed external IDs in this run
+            rows = [] # One row per position, written with a single upsert
 
             for pos in positions:
                 # Use position ID or instrument URL as external ID
@@ -1152,6 +1388,9 @@ def register_routes(app):
                 if not external_id:
                      current_app.logger.warning(f"Skipping position due to missing ID: {pos.get('symbol')}")
                      continue
+                if external_id in processed_ids:
+                     current_app.logger.warning(f"Skipping duplicate Robinhood position: {external_id}")
+                     continue
 
                 processed_ids.add(external_id)
                 quantity = pos.get('quantity')
@@ -1165,41 +1404,37 @@ def register_routes(app):
                      current_app.logger.warning(f"Invalid quantity for {symbol}: {quantity}. Setting to 0.")
                      balance_quantity = 0.0
 
-                # Find/Create Account in local DB
-                account = Account.query.filter_by(external_id=external_id, source='Robinhood').first()
-
-                if account:
-                    # Update existing
-                    account.balance = balance_quantity # Store quantity in balance field for now
-                    account.name = symbol or account.name # Update symbol if available
-                    accounts_updated += 1
-                    current_app.logger.debug(f"Updating Robinhood account: {symbol} ({external_id}) Qty: {balance_quantity}")
-                else:
-                    # Create new
-                    new_account = Account(
-                        external_id=external_id,
-                        name=symbol or f"RH_{pos_type}_{external_id}", # Fallback name
-                        source='Robinhood',
-                        # Map position type ('stock', 'crypto') to our types
-                        account_type='crypto' if pos_type == 'crypto' else 'investment',
-                        account_subtype=symbol, # Store symbol as subtype
-                        balance=balance_quantity # Store quantity
-                    )
-                    db.session.add(new_account)
-                    accounts_created += 1
-                    current_app.logger.info(f"Creating Robinhood account: {symbol} ({external_id}) Qty: {balance_quantity}")
-
-            # Optional: Deactivate/Zero out accounts previously linked to Robinhood but not in the current positions
-            # old_accounts = Account.query.filter(Account.source == 'Robinhood', ~Account.external_id.in_(processed_ids)).all()
-            # for old_acc in old_accounts:
-            #     old_acc.balance = 0.0 # Or mark as inactive
-            #     accounts_updated +=1
-            #     current_app.logger.info(f"Zeroing out stale Robinhood account: {old_acc.name} ({old_acc.external_id})")
-
-
-            # Commit DB changes
+                rows.append({
+                    'external_id': external_id,
+                    'name': symbol or f"RH_{pos_type}_{external_id}", # Fallback name for new accounts
+                    'source': 'Robinhood',
+                    # Map position type ('stock', 'crypto') to our types
+                    'account_type': 'crypto' if pos_type == 'crypto' else 'investment',
+                    'account_subtype': symbol, # Store symbol as subtype
+                    'balance': balance_quantity # Store quantity in balance field for now
+                })
+
+            # Optional: Zero out accounts previously linked to Robinhood but not in the current positions (one UPDATE)
+            # stale = db.session.execute(
+            #     update(Account).where(
+            #         Account.source == 'Robinhood',
+            #         Account.external_id.notin_(processed_ids)
+            #     ).values(balance=0)
+            # )
+            # accounts_updated += stale.rowcount
+
+            # Upsert all positions in one statement and commit
             try:
+                accounts_created, accounts_updated = upsert_accounts(
+                    rows, 'Robinhood',
+                    lambda excluded: {
+                        'balance': excluded.balance,
+                        # Only overwrite the name when Robinhood gave us a symbol
+                        'name': case((excluded.account_subtype.isnot(None), excluded.name), else_=Account.name)
+                    }
+                )
                 db.session.commit()
+                current_app.logger.info(f"Robinhood upsert: created {accounts_created}, updated {accounts_updated}")
             except SQLAlchemyError as db_err:
                 db.session.rollback()
                 current_app.logger.error(f"Database error during Robinhood sync commit: {db_err}", exc_info=True)
@@ -1218,8 +1453,12 @@ def register_routes(app):
 
     # --- Coinbase Sync Route ---
     @app.route('/api/coinbase/sync', methods=['POST'])
+    def queue_coinbase_sync():
+        """Queues sync_coinbase_portfolio on the scheduler; poll /api/jobs/<job_id> for the result."""
+        return queue_sync_task(sync_coinbase_portfolio, 'coinbase_sync')
+
     def sync_coinbase_portfolio():
-        """Fetches accounts/wallets from Coinbase and syncs with local DB."""
+        """Fetches accounts/wallets from Coinbase and syncs with local DB. Runs as a background task."""
         if 'coinbase_client' not in current_app.extensions:
              return jsonify({'error': 'Coinbase service not initialized. Check API keys.'}), 503
 
@@ -1233,6 +1472,7 @@ def register_routes(app):
                 return jsonify({'message': 'No accounts found or failed to fetch from Coinbase.'}), 200
 
             processed_ids = set() # Keep track of processed external IDs in this run
+            rows = [] # One row per wallet, written with a single upsert
 
             for cb_account in coinbase_accounts:
                 uuid = cb_account.uuid
@@ -1243,6 +1483,9 @@ def register_routes(app):
                 if not uuid or not currency:
                     current_app.logger.warning(f"Skipping Coinbase account due to missing uuid or currency: {cb_account}")
                     continue
+                if uuid in processed_ids:
+                    current_app.logger.warning(f"Skipping duplicate Coinbase account: {uuid}")
+                    continue
 
                 processed_ids.add(uuid)
 
@@ -1257,36 +1500,26 @@ def register_routes(app):
                 # if balance_amount <= 0:
                 #     continue
 
-                # Find/Create Account in local DB
-                account = Account.query.filter_by(external_id=uuid, source='Coinbase').first()
-
-                if account:
-                    # Update existing
-                    account.balance = balance_amount # Store native currency amount
-                    # Maybe update name if needed, but currency code is likely stable
-                    # account.name = currency
-                    accounts_updated += 1
-                    current_app.logger.debug(f"Updating Coinbase account: {currency} ({uuid}) Amt: {balance_amount}")
-                else:
-                    # Create new
-                    new_account = Account(
-                        external_id=uuid,
-                        name=f"{currency} Wallet", # e.g., "BTC Wallet"
-                        source='Coinbase',
-                        account_type='crypto',
-                        account_subtype=currency, # Store currency code as subtype
-                        balance=balance_amount # Store native quantity
-                    )
-                    db.session.add(new_account)
-                    accounts_created += 1
-                    current_app.logger.info(f"Creating Coinbase account: {currency} ({uuid}) Amt: {balance_amount}")
+                rows.append({
+                    'external_id': uuid,
+                    'name': f"{currency} Wallet", # e.g., "BTC Wallet"
+                    'source': 'Coinbase',
+                    'account_type': 'crypto',
+                    'account_subtype': currency, # Store currency code as subtype
+                    'balance': balance_amount # Store native quantity
+                })
 
             # Optional: Deactivate/Zero out accounts previously linked but not in current response
             # ... (similar logic as Robinhood/Plaid sync) ...
 
-            # Commit DB changes
+            # Upsert all wallets in one statement and commit
             try:
+                # Currency code (and so the name) is stable; only the balance changes
+                accounts_created, accounts_updated = upsert_accounts(
+                    rows, 'Coinbase', lambda excluded: {'balance': excluded.balance}
+                )
                 db.session.commit()
+                current_app.logger.info(f"Coinbase upsert: created {accounts_created}, updated {accounts_updated}")
             except SQLAlchemyError as db_err:
                 db.session.rollback()
                 current_app.logger.error(f"Database error during Coinbase sync commit: {db_err}", exc_info=True)
@@ -1303,29 +1536,36 @@ def register_routes(app):
             current_app.logger.error(f"Error during Coinbase sync: {e}", exc_info=True)
             return jsonify({'error': 'Failed to sync Coinbase portfolio'}), 500
 
-     # --- Manual Transaction Sync Trigger Route ---
-    # This reuses the same mechanism as the market sync trigger,
-    # running the *entire* background job immediately.
+    # --- Manual Transaction Sync Trigger Route ---
+    # Queues a one-shot run of the combined background job (prices & transactions)
+    # on the scheduler's worker pool instead of rescheduling the recurring job.
     @app.route('/api/plaid/sync_transactions', methods=['POST'])
     def trigger_transaction_sync():
         """Manually triggers the background sync job (prices & transactions)."""
-        scheduler = current_app.extensions.get('scheduler')
+        scheduler = app.extensions.get('scheduler')
         if not scheduler or not scheduler.running:
             return jsonify({'error': 'Scheduler not running'}), 503
 
-        job_id = 'background_sync_job' # ID of the combined job
         try:
-            scheduler.modify_job(job_id, next_run_time=datetime.datetime.now(datetime.timezone.utc))
-            current_app.logger.info(f"Manually triggered background sync job '{job_id}' to run now.")
-            return jsonify({'message': f"Background sync job '{job_id}' triggered."}), 202
+            status, job = enqueue_background_sync(current_app._get_current_object())
+            if status == 'running':
+                return jsonify({'message': "A background sync is already running; try again once it finishes."}), 409
+            if job is None:
+                return jsonify({'message': "Background sync was triggered moments ago; request coalesced."}), 202
+            current_app.logger.info(f"Queued one-shot background sync job '{job.id}'.")
+            return jsonify({'message': f"Background sync job '{job.id}' queued."}), 202
         except Exception as e:
-            current_app.logger.error(f"Error triggering background sync job '{job_id}': {e}", exc_info=True)
-            return jsonify({'error': f"Failed to trigger background sync job '{job_id}'"}), 500
+            current_app.logger.error(f"Error queueing background sync job: {e}", exc_info=True)
+            return jsonify({'error': "Failed to queue background sync job"}), 500
 
     # --- Add Portfolio Overview Route ---
     @app.route('/api/portfolio/overview', methods=['GET'])
     def get_portfolio_overview():
-        """Calculates and returns a consolidated overview of all accounts."""
+        """
+        Calculates and returns a consolidated overview of all accounts.
+        Pass `?summary=1` to get only the category totals (no per-account details).
+        """
+        summary_only = request.args.get('summary', '').lower() in ('1', 'true')
         portfolio = {
             'total_value_usd': decimal.Decimal(0.0),
             'cash_total_usd': decimal.Decimal(0.0),
@@ -1335,107 +1575,120 @@ def register_routes(app):
             'loan_total_usd': decimal.Decimal(0.0),
             'account_details': [] # List to hold details of each account
         }
-        # Map our account types/sources to portfolio categories
-        type_mapping = {
-             'depository': 'cash',
-             'investment': 'investment',
-             'crypto': 'crypto',
-             'loan': 'loan'
-        }
-        source_mapping = { # To categorize holdings by where they came from
-             'Plaid': 'Bank/Broker (via Plaid)',
-             'PlaidInvestment': 'Investment (via Plaid)',
-             'Coinbase': 'Crypto (via Coinbase)',
-             'Robinhood': 'Investment/Crypto (via Robinhood)', # Combined for now
-             'Manual': 'Manual Entry'
-        }
 
         try:
-            # 1. Fetch all accounts from our local database
-            accounts = Account.query.all()
-            if not accounts:
+            # Prices only apply to investment/crypto accounts, whose subtype holds the ticker/crypto symbol
+            priced_types = ('investment', 'crypto')
+
+            # The response only changes when a price or account row changes; derive an ETag from the
+            # trigger-maintained data_version counters, which move exactly when such writes commit
+            # (timestamps from now() are transaction-start times, so a long sync can commit rows older
+            # than a max already seen). The same round trip returns the account count and the oldest
+            # price referenced by any account (prices_as_of).
+            used_symbols = select(Account.account_subtype).where(Account.account_type.in_(priced_types))
+            accounts_version, prices_version, oldest_price_time, account_total = db.session.query(
+                data_version_expr('accounts'),
+                data_version_expr('prices'),
+                select(func.min(MarketPrice.last_updated)).where(MarketPrice.symbol.in_(used_symbols)).scalar_subquery(),
+                func.count(Account.id)
+            ).one()
+            etag = hashlib.md5(f"{accounts_version}|{prices_version}|{summary_only}".encode()).hexdigest()
+            if etag in request.if_none_match:
+                response = current_app.response_class(status=304)
+                response.set_etag(etag)
+                return response
+            if not account_total:
                 return jsonify({'message': 'No accounts found in the database.'}), 200
 
-            # 2. Get cached prices (or relevant ones) into a dictionary
-            cached_prices_query = MarketPrice.query.all()
-            price_cache = {mp.symbol: {'price': mp.price_usd, 'time': mp.last_updated} for mp in cached_prices_query}
-
-            # Find the oldest timestamp from the prices used
-            oldest_price_time = None
-            if price_cache:
-                # Query min time directly or find from dict
-                # oldest_price_time = db.session.query(func.min(MarketPrice.last_updated)).scalar()
-                valid_times = [p['time'] for p in price_cache.values() if p.get('time')]
-                if valid_times:
-                     oldest_price_time = min(valid_times)
-                     # Format timestamp for display (ISO 8601 is good)
-                     portfolio['prices_as_of'] = oldest_price_time.isoformat()
-
-            # 3. Process each account
-            for acc in accounts:
-                account_info = {
-                    'id': acc.id,
-                    'name': acc.name,
-                    'balance': float(acc.balance), # Native balance (quantity or cash amount)
-                    'type': acc.account_type,
-                    'subtype': acc.account_subtype,
-                    'source': source_mapping.get(acc.source, acc.source),
-                    'external_id': acc.external_id,
-                    'market_value_usd': None, # Will calculate if possible
-                    'price_usd': None,
-                    'category': 'other' # Default category
-                }
-                if account_info['balance'] <= 0: continue
-                category = type_mapping.get(acc.account_type, 'other')
-                account_info['category'] = category
-
-                native_balance = to_decimal(acc.balance)
-                market_value_usd = decimal.Decimal(0.0)
-                price_usd = None
-
-                if category == 'cash':
-                    market_value_usd = native_balance # Assuming cash balance is in USD
-                    portfolio['cash_total_usd'] += market_value_usd
-                elif category == 'loan':
-                     market_value_usd = native_balance # Outstanding loan amount
-                     portfolio['loan_total_usd'] += market_value_usd
-                     # Loans typically reduce net worth, but we sum positive value here
-                elif category in ['investment', 'crypto']:
-                     symbol = acc.account_subtype # Assume subtype holds the ticker/crypto symbol
-                     if symbol and symbol in price_cache:
-                         cached = price_cache[symbol]
-                         price_usd = to_decimal(cached['price'])
-                         market_value_usd = native_balance * price_usd
-                         account_info['price_usd'] = float(price_usd)
-                     elif symbol:
-                         current_app.logger.warning(f"Price not found in cache for symbol: {symbol}")
-                         # Market value remains 0
-                     
-                     # Add to category total
-                     if category == 'investment': portfolio['investment_total_usd'] += market_value_usd
-                     elif category == 'crypto': portfolio['crypto_total_usd'] += market_value_usd
-                else:
-                     portfolio['other_assets_total_usd'] += native_balance
-
-                account_info['market_value_usd'] = float(market_value_usd)
-                portfolio['account_details'].append(account_info)
+            # Same inputs, same body: serve the cached bytes without re-running the aggregation
+            with _portfolio_cache_lock:
+                cached_body = _portfolio_cache.get(etag)
+            if cached_body is not None:
+                response = current_app.response_class(cached_body, mimetype='application/json')
+                response.set_etag(etag)
+                return response
+
+            def etag_response(payload):
+                """Serializes the payload, tags it with the ETag and caches the body under it."""
+                response = jsonify(payload)
+                response.set_etag(etag)
+                with _portfolio_cache_lock:
+                    _portfolio_cache[etag] = response.get_data()
+                return response
+
+            price_join = and_(MarketPrice.symbol == Account.account_subtype, Account.account_type.in_(priced_types))
+            # Investment/crypto are valued at the cached price (0 if none), everything else at its native balance
+            value_expr = case(
+                (Account.account_type.in_(priced_types), Account.balance * func.coalesce(MarketPrice.price_usd, 0)),
+                else_=Account.balance
+            )
 
+            # 1. Category totals in one GROUP BY over the same valuation expression; account types
+            #    are mapped to categories in SQL so each category comes back as a single row
+            category_expr = case(dict(TYPE_MAPPING), value=Account.account_type, else_='other')
+            totals_query = db.session.query(
+                category_expr,
+                func.sum(value_expr)
+            ).outerjoin(
+                MarketPrice, price_join
+            ).filter(
+                Account.balance > 0
+            ).group_by(
+                category_expr
+            ).all()
+            for category, total in totals_query:
+                total_key = 'other_assets_total_usd' if category == 'other' else f'{category}_total_usd'
+                portfolio[total_key] = to_decimal(total)
 
+            # 2. Oldest timestamp among the prices actually referenced by accounts (fetched with the ETag inputs)
+            if oldest_price_time:
+                # Format timestamp for display (ISO 8601 is good)
+                portfolio['prices_as_of'] = oldest_price_time.isoformat()
 
             # Calculate overall total value
             portfolio['total_value_usd'] = (portfolio['cash_total_usd'] +
                                           portfolio['investment_total_usd'] +
                                           portfolio['crypto_total_usd'] +
                                           portfolio['other_assets_total_usd'])
-            # Convert Decimal totals back to float for JSON serialization
+            # Quantize only the final totals; SUM(balance * price) carries the full column scale
             for key in portfolio:
-                 if isinstance(portfolio[key], decimal.Decimal):
-                      portfolio[key] = float(portfolio[key])
+                if key.endswith('_usd'):
+                    portfolio[key] = portfolio[key].quantize(CENTS)
+
+            # ?summary=1 stops here: totals only, no per-account rows
+            if summary_only:
+                del portfolio['account_details']
+                return etag_response(portfolio)
+
+            # 3. Stream account details from a server-side cursor; columns are labelled so each
+            #    row mapping is already the account_details entry (no ORM hydration, no per-row dict build).
+            #    price_join only matches investment/crypto accounts, so price_usd is NULL for the rest.
+            accounts = db.session.execute(
+                select(
+                    Account.id,
+                    Account.name,
+                    Account.balance, # Native balance (quantity or cash amount)
+                    Account.account_type.label('type'),
+                    Account.account_subtype.label('subtype'),
+                    case(dict(SOURCE_MAPPING), value=Account.source, else_=Account.source).label('source'),
+                    Account.external_id,
+                    value_expr.label('market_value_usd'),
+                    MarketPrice.price_usd,
+                    category_expr.label('category')
+                ).outerjoin(MarketPrice, price_join).where(Account.balance > 0).execution_options(yield_per=500)
+            ).mappings()
+            for acc in accounts:
+                if acc['category'] in priced_types and acc['price_usd'] is None and acc['subtype']:
+                    current_app.logger.warning(f"Price not found in cache for symbol: {acc['subtype']}")
+                    # Market value remains 0
+                portfolio['account_details'].append(dict(acc))
 
-            return jsonify(portfolio)
+            # Decimal totals go out as-is; the JSON provider emits them as raw numbers
+            return etag_response(portfolio)
 
         except SQLAlchemyError as db_err:
-            current_app.logger.error(f"Database error fetching accounts for portfolio overview: {db_err}", exc_info=True)
+            # Transient DB errors on this polled route log without a traceback; unexpected errors keep theirs
+            current_app.logger.warning(f"Database error fetching accounts for portfolio overview: {db_err!r}")
             return jsonify({'error': 'Database error fetching accounts'}), 500
         except Exception as e:
              current_app.logger.error(f"Unexpected error generating portfolio overview: {e}", exc_info=True)
@@ -1445,21 +1698,20 @@ def register_routes(app):
     @app.route('/api/market/sync', methods=['POST'])
     def trigger_market_sync():
         """Manually triggers the background market price fetch job."""
-        scheduler = current_app.extensions.get('scheduler')
+        scheduler = app.extensions.get('scheduler')
         if not scheduler or not scheduler.running:
             return jsonify({'error': 'Scheduler not running or not available'}), 503 # Service Unavailable
 
-        job_id = 'background_sync_job' # The ID we gave the job in app.py
         try:
-            # Option 1: Modify next_run_time to run ASAP (preferred for background execution)
-            scheduler.modify_job(job_id, next_run_time=datetime.datetime.now(datetime.timezone.utc))
-            current_app.logger.info(f"Manually triggered market sync job '{job_id}' to run now.")
-            return jsonify({'message': f"Market data sync job '{job_id}' triggered."}), 202 # Accepted
-
-            # Option 2: Run job directly (can block request if job is long) - Less ideal
-            # scheduler.run_job(job_id, blocking=False) # run_job might not exist or work this way easily with context
-            # return jsonify({'message': f"Market data sync job '{job_id}' run attempt initiated."}), 200
+            # Queue a one-shot run instead of modify_job(), which rewrites the recurring job in the jobstore
+            status, job = enqueue_background_sync(current_app._get_current_object())
+            if status == 'running':
+                return jsonify({'message': "A market data sync is already running; try again once it finishes."}), 409
+            if job is None:
+                return jsonify({'message': "Market data sync was triggered moments ago; request coalesced."}), 202
+            current_app.logger.info(f"Manually triggered market sync job '{job.id}' to run now.")
+            return jsonify({'message': f"Market data sync job '{job.id}' triggered."}), 202 # Accepted
 
         except Exception as e:
-            current_app.logger.error(f"Error triggering market sync job '{job_id}': {e}", exc_info=True)
-            return jsonify({'error': f"Failed to trigger market sync job '{job_id}'"}), 500
+            current_app.logger.error(f"Error triggering market sync job: {e}", exc_info=True)
+            return jsonify({'error': "Failed to trigger market sync job"}), 500
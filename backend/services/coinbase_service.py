@@ -25,32 +25,22 @@ class CoinbaseService:
         """Fetches all brokerage accounts (wallets) using the SDK."""
         all_accounts = []
         try:
-            # The SDK's list_accounts method handles authentication and pagination
-            # Check SDK documentation for exact method signature and parameters (like limit)
-            # Example: Fetching up to 250 accounts per page (max allowed by API)
+            # The SDK handles authentication; pages of up to 250 accounts (max allowed by API) are
+            # followed via the response cursor
             self.logger.info("Fetching accounts")
-            response = self.client.get_accounts() # Initial call
-            self.logger.info(f"Print test out: {response.accounts[0].available_balance['value']}")
-
-            if response:
+            cursor = None
+            while True:
+                response = self.client.get_accounts(limit=250, cursor=cursor)
+                if not response or response.accounts is None:
+                    self.logger.warning(f"Coinbase get_accounts response missing 'accounts': {response}")
+                    break
                 all_accounts.extend(response.accounts)
                 self.logger.info(f"Fetched {len(response.accounts)} Coinbase accounts page.")
 
-                # Handle pagination using the cursor from the response
-                # The SDK might have helper methods or you handle cursor manually like below
-                # next_cursor = response.get('pagination', {}).get('next_cursor')
-                # while next_cursor:
-                #     self.logger.info(f"Fetching next Coinbase accounts page (cursor: {next_cursor[:5]}...)")
-                #     response = self.client.list_accounts(limit=250, cursor=next_cursor)
-                #     if response and 'accounts' in response:
-                #         all_accounts.extend(response['accounts'])
-                #         next_cursor = response.get('pagination', {}).get('next_cursor')
-                #     else:
-                #          self.logger.warning("Pagination response missing 'accounts' or invalid.")
-                #          break # Stop if pagination fails
-                self.logger.info(f"Appened to all_accounts {len(all_accounts)}")
-            else:
-                self.logger.warning(f"Coinbase list_accounts initial response missing 'accounts' key: {response}")
+                # Follow the pagination cursor until the API reports no further pages
+                cursor = getattr(response, 'cursor', None)
+                if not getattr(response, 'has_next', False) or not cursor:
+                    break
 
             self.logger.info(f"Total Coinbase accounts fetched: {len(all_accounts)}")
             return all_accounts
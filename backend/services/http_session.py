@@ -0,0 +1,25 @@
+# backend/services/http_session.py
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Keep-alive connections held per host; enough for the bulk price fetch pool plus request threads
+POOL_SIZE = 32
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+def create_session(retries: int = 0, backoff_factor: float = 0.5) -> requests.Session:
+    """
+    Creates a requests.Session with a larger keep-alive connection pool for HTTPS.
+    With `retries` > 0, idempotent requests that fail to connect or return 429/5xx are
+    retried at the transport layer (honoring Retry-After) before the response is returned.
+    """
+    session = requests.Session()
+    max_retries = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        raise_on_status=False # Hand the last response back so callers' raise_for_status() applies
+    ) if retries else 0
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=max_retries)
+    session.mount('https://', adapter)
+    return session
@@ -1,75 +1,166 @@
 # backend/services/market_data_service.py
+import datetime
+import orjson
+import random
 import requests
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from zoneinfo import ZoneInfo
+from cachetools import TTLCache
+from services.http_session import create_session
 
 class MarketDataService:
     """
     Handles fetching market data (stock/crypto prices) from Alpha Vantage.
     """
     BASE_URL = "https://www.alphavantage.co/query"
-    # Simple cache to avoid hitting rate limits too quickly during a single request
-    # For more robust caching, consider Flask-Caching or Redis later.
-    CACHE = {}
-    CACHE_TTL = 300 # Cache prices for 5 minutes (300 seconds)
+    # Price cache freshness follows each asset's refresh cadence (seconds): crypto trades
+    # around the clock, stock quotes only move while the US market is open (after the close,
+    # any quote fetched since the last close is current until the next open)
+    CRYPTO_TTL = 30
+    STOCK_TTL_MARKET_HOURS = 60
+    # Entries are kept (stale) long enough to span a long weekend so a last known price is on hand
+    CACHE_MAX_AGE = 4 * 86400
+    CACHE_MAX_SIZE = 1024
+    MARKET_TZ = ZoneInfo('America/New_York')
+    MARKET_OPEN = datetime.time(9, 30)
+    MARKET_CLOSE = datetime.time(16, 0)
+    # Retry policy for transient failures (timeouts, connection errors, 429/5xx, rate-limit "Note")
+    MAX_RETRIES = 3
+    RETRY_BASE_DELAY = 1.0 # Seconds; doubled on each attempt
+    RATE_LIMIT_BASE_DELAY = 12.0 # Free tier allows 5 calls/min
+    RETRY_JITTER = 0.5 # Up to +50% random spread so retries don't line up
+    RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+    # Bulk fetches fan out over a small pool; the semaphore caps in-flight HTTP calls across all callers
+    BULK_MAX_WORKERS = 8
+    MAX_CONCURRENT_REQUESTS = 5
 
     def __init__(self, api_key, logger):
         if not api_key:
             raise ValueError("Alpha Vantage API Key must be provided.")
         self.api_key = api_key
         self.logger = logger
-        self.session = requests.Session()
+        # Pooled keep-alive connections; retries stay in _make_request, which also handles rate-limit payloads
+        self.session = create_session()
+        self._request_slots = threading.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+        # Shared by the bulk fetch threads, so every access goes through the lock
+        self.cache = TTLCache(maxsize=self.CACHE_MAX_SIZE, ttl=self.CACHE_MAX_AGE)
+        self._cache_lock = threading.Lock()
         self.logger.info("MarketDataService initialized.")
 
-    def _clear_expired_cache(self):
-        """Removes expired entries from the simple cache."""
-        now = time.time()
-        expired_keys = [k for k, (timestamp, _) in self.CACHE.items() if now - timestamp > self.CACHE_TTL]
-        for key in expired_keys:
-            del self.CACHE[key]
+    def _us_market_open(self) -> bool:
+        """True during regular US equity trading hours (Mon-Fri 9:30-16:00 New York time; holidays not tracked)."""
+        now = datetime.datetime.now(self.MARKET_TZ)
+        return now.weekday() < 5 and self.MARKET_OPEN <= now.time() < self.MARKET_CLOSE
 
-    def _make_request(self, params: dict) -> dict | None:
-        """Makes a request to the Alpha Vantage API."""
+    def _last_market_close(self) -> float:
+        """Epoch time of the most recent regular-session close (16:00 New York, Mon-Fri)."""
+        now = datetime.datetime.now(self.MARKET_TZ)
+        close = datetime.datetime.combine(now.date(), self.MARKET_CLOSE, tzinfo=self.MARKET_TZ)
+        while close > now or close.weekday() >= 5:
+            close -= datetime.timedelta(days=1)
+        return close.timestamp()
+
+    def _stock_fresh_since(self) -> float:
+        """Cutoff for a current stock quote: the last minute while open, else the last close."""
+        if self._us_market_open():
+            return time.time() - self.STOCK_TTL_MARKET_HOURS
+        return self._last_market_close()
+
+    def _cache_get(self, key: str, fresh_since: float) -> float | None:
+        """Returns the cached price for `key` if it was stored at or after `fresh_since` (epoch seconds)."""
+        with self._cache_lock:
+            entry = self.cache.get(key)
+        if entry is None:
+            return None
+        timestamp, price = entry
+        return price if timestamp >= fresh_since else None
+
+    def _cache_get_stale(self, key: str, label: str) -> float | None:
+        """Last known price for `key` regardless of freshness; used when a fetch fails."""
+        with self._cache_lock:
+            entry = self.cache.get(key)
+        if entry is None:
+            return None
+        timestamp, price = entry
+        self.logger.warning(f"Serving stale price for {label} ({time.time() - timestamp:.0f}s old) after a failed fetch.")
+        return price
+
+    def _cache_put(self, key: str, price: float):
+        with self._cache_lock:
+            self.cache[key] = (time.time(), price)
+
+    def _backoff_delay(self, attempt: int, base_delay: float) -> float:
+        """Exponential backoff with jitter for the given (0-based) retry attempt."""
+        return base_delay * 2 ** attempt * (1 + random.random() * self.RETRY_JITTER)
+
+    def _make_request(self, params: dict, max_retries: int | None = None) -> dict | None:
+        """
+        Makes a request to the Alpha Vantage API, retrying transient failures with backoff.
+        Returns None on unrecoverable errors ("Error Message", 4xx) or once retries are exhausted.
+        """
+        if max_retries is None:
+            max_retries = self.MAX_RETRIES
         params['apikey'] = self.api_key
         self.logger.debug(f"Alpha Vantage Request Params: {params}")
-        try:
-            response = self.session.get(self.BASE_URL, params=params, timeout=10) # Added timeout
-            response.raise_for_status() # Check for HTTP errors
-            data = response.json()
-
-            # --- Alpha Vantage Specific Error/Limit Handling ---
-            if not data:
-                 self.logger.warning("Alpha Vantage returned empty response.")
-                 return None
-            if "Error Message" in data:
-                self.logger.error(f"Alpha Vantage API Error: {data['Error Message']}")
+
+        for attempt in range(max_retries + 1):
+            retry_base_delay = None # Set when this attempt failed in a retryable way
+            try:
+                with self._request_slots:
+                    response = self.session.get(self.BASE_URL, params=params, timeout=10) # Added timeout
+                if response.status_code in self.RETRYABLE_STATUS_CODES:
+                    self.logger.warning(f"Alpha Vantage returned HTTP {response.status_code} (attempt {attempt + 1}/{max_retries + 1}).")
+                    retry_base_delay = self.RETRY_BASE_DELAY
+                else:
+                    response.raise_for_status() # Check for (non-retryable) HTTP errors
+                    data = orjson.loads(response.content)
+
+                    # --- Alpha Vantage Specific Error/Limit Handling ---
+                    if not data:
+                         self.logger.warning("Alpha Vantage returned empty response.")
+                         return None
+                    if "Error Message" in data:
+                        self.logger.error(f"Alpha Vantage API Error: {data['Error Message']}")
+                        return None
+                    if "Note" in data: # Often indicates rate limiting on free tier
+                        self.logger.warning(f"Alpha Vantage API Note (attempt {attempt + 1}/{max_retries + 1}): {data['Note']}")
+                        retry_base_delay = self.RATE_LIMIT_BASE_DELAY
+                    else:
+                        return data
+                    # ----------------------------------------------------
+
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                self.logger.warning(f"Alpha Vantage request error (attempt {attempt + 1}/{max_retries + 1}): {e}")
+                retry_base_delay = self.RETRY_BASE_DELAY
+            except requests.exceptions.RequestException as e:
+                self.logger.error(f"Alpha Vantage request failed: {e}")
+                if hasattr(e, 'response') and e.response is not None:
+                    self.logger.error(f"Response Status: {e.response.status_code}")
+                    self.logger.error(f"Response Body: {e.response.text}")
                 return None
-            if "Note" in data: # Often indicates rate limiting on free tier
-                self.logger.warning(f"Alpha Vantage API Note: {data['Note']}")
-                # Treat rate limit note as an error for price fetching
+            except ValueError as e: # Handles JSON decoding errors (orjson.JSONDecodeError is a ValueError)
+                self.logger.error(f"Failed to decode Alpha Vantage JSON response: {e}")
                 return None
-            # ----------------------------------------------------
-
-            return data
-
-        except requests.exceptions.Timeout:
-             self.logger.error("Alpha Vantage request timed out.")
-             return None
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"Alpha Vantage request failed: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                self.logger.error(f"Response Status: {e.response.status_code}")
-                self.logger.error(f"Response Body: {e.response.text}")
-            return None
-        except ValueError as e: # Handles JSON decoding errors
-            self.logger.error(f"Failed to decode Alpha Vantage JSON response: {e}")
-            return None
 
-    def get_stock_price(self, symbol: str) -> float | None:
-        """Fetches the current price for a stock symbol using GLOBAL_QUOTE."""
-        self._clear_expired_cache()
-        cache_key = f"stock_{symbol}"
-        if cache_key in self.CACHE:
-            _, price = self.CACHE[cache_key]
+            if attempt < max_retries:
+                delay = self._backoff_delay(attempt, retry_base_delay)
+                self.logger.info(f"Retrying Alpha Vantage request in {delay:.1f}s...")
+                time.sleep(delay)
+
+        self.logger.error(f"Alpha Vantage request failed after {max_retries + 1} attempts.")
+        return None
+
+    def get_stock_price(self, symbol: str, allow_stale: bool = True) -> float | None:
+        """
+        Fetches the current price for a stock symbol using GLOBAL_QUOTE.
+        If the fetch fails, the last known (stale) quote is returned unless `allow_stale` is False.
+        """
+        cache_key = f"price:stock:{symbol}"
+        # Outside market hours this skips Alpha Vantage entirely once a post-close quote is cached
+        price = self._cache_get(cache_key, self._stock_fresh_since())
+        if price is not None:
             self.logger.debug(f"Cache hit for stock: {symbol}")
             return price
 
@@ -85,7 +176,7 @@ class MarketDataService:
                 price_str = data['Global Quote'].get('05. price')
                 if price_str is not None:
                     price = float(price_str)
-                    self.CACHE[cache_key] = (time.time(), price) # Update cache
+                    self._cache_put(cache_key, price) # Update cache
                     return price
                 else:
                      self.logger.warning(f"Price field ('05. price') not found in Global Quote for {symbol}")
@@ -94,16 +185,19 @@ class MarketDataService:
         else:
              self.logger.warning(f"Could not find 'Global Quote' or valid price data for stock: {symbol}")
 
-        return None # Return None if price not found or error
+        # Fall back to the last known quote (rate limit, outage) rather than dropping the symbol
+        return self._cache_get_stale(cache_key, symbol) if allow_stale else None
 
-    def get_crypto_price(self, symbol: str, target_currency: str = 'USD') -> float | None:
-        """Fetches the current exchange rate for a crypto symbol to a target currency."""
-        self._clear_expired_cache()
+    def get_crypto_price(self, symbol: str, target_currency: str = 'USD', allow_stale: bool = True) -> float | None:
+        """
+        Fetches the current exchange rate for a crypto symbol to a target currency.
+        If the fetch fails, the last known (stale) rate is returned unless `allow_stale` is False.
+        """
         # Normalize crypto symbol if needed (e.g., BTC vs BTC-USD) - AV usually just wants 'BTC'
         normalized_symbol = symbol.upper().replace('-USD', '')
-        cache_key = f"crypto_{normalized_symbol}_{target_currency}"
-        if cache_key in self.CACHE:
-             _, price = self.CACHE[cache_key]
+        cache_key = f"price:crypto:{normalized_symbol}:{target_currency}"
+        price = self._cache_get(cache_key, time.time() - self.CRYPTO_TTL)
+        if price is not None:
              self.logger.debug(f"Cache hit for crypto: {symbol} -> {target_currency}")
              return price
 
@@ -120,7 +214,7 @@ class MarketDataService:
                 rate_str = data['Realtime Currency Exchange Rate'].get('5. Exchange Rate')
                 if rate_str is not None:
                     price = float(rate_str)
-                    self.CACHE[cache_key] = (time.time(), price) # Update cache
+                    self._cache_put(cache_key, price) # Update cache
                     return price
                 else:
                      self.logger.warning(f"Exchange rate field ('5. Exchange Rate') not found for {normalized_symbol}/{target_currency}")
@@ -129,4 +223,28 @@ class MarketDataService:
         else:
             self.logger.warning(f"Could not find 'Realtime Currency Exchange Rate' data for crypto: {normalized_symbol}/{target_currency}")
 
-        return None # Return None if price not found or error
+        # Fall back to the last known rate (rate limit, outage) rather than dropping the symbol
+        return self._cache_get_stale(cache_key, f"{normalized_symbol}/{target_currency}") if allow_stale else None
+
+    def get_prices_bulk(self, symbols: list[tuple[str, str]], allow_stale: bool = True) -> dict:
+        """
+        Fetches many prices concurrently. `symbols` holds (kind, symbol) pairs where kind is
+        'crypto' for crypto rates and anything else (e.g. 'investment') for stock quotes.
+        Returns {(kind, symbol): price or None}. Pass allow_stale=False when the prices will be
+        stored as fresh, so a failed fetch yields None instead of a last known value.
+        """
+        if not symbols:
+            return {}
+
+        def fetch(kind, symbol):
+            try:
+                if kind == 'crypto':
+                    return self.get_crypto_price(symbol, target_currency='USD', allow_stale=allow_stale)
+                return self.get_stock_price(symbol, allow_stale=allow_stale)
+            except Exception as e:
+                self.logger.error(f"Error fetching price for {symbol}: {e}", exc_info=True)
+                return None
+
+        with ThreadPoolExecutor(max_workers=min(self.BULK_MAX_WORKERS, len(symbols))) as executor:
+            prices = executor.map(lambda pair: fetch(*pair), symbols)
+            return dict(zip(symbols, prices))
@@ -6,6 +6,9 @@ from plaid.model.transactions_sync_request import TransactionsSyncRequest
 # Assuming db is accessible via an imported 'app' or directly if configured
 from extensions import db # Adjusted based on previous successful imports in shell
 from models import Account, Transaction, PlaidItem
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, select, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
 
 # Placeholder - Category Mapping (Refine later)
@@ -16,6 +19,10 @@ PLAID_CATEGORY_TO_BUDGET_BUCKET = {
     "Mortgage": "Housing", "Payroll": "Income", "Deposit": "Income",
     "Interest Earned": "Income", "_DEFAULT_": "Miscellaneous"
 }
+DEFAULT_BUDGET_BUCKET = PLAID_CATEGORY_TO_BUDGET_BUCKET["_DEFAULT_"]
+
+# /transactions/sync maximum; fewer, larger pages mean fewer Plaid round trips and DB statements
+TRANSACTIONS_SYNC_PAGE_SIZE = 500
 
 class PlaidService:
     def __init__(self, plaid_client, logger):
@@ -25,10 +32,61 @@ class PlaidService:
          self.logger.info("PlaidService initialized.")
 
     def _map_category(self, plaid_categories):
-         if not plaid_categories: return PLAID_CATEGORY_TO_BUDGET_BUCKET["_DEFAULT_"]
-         primary = plaid_categories[0]
-         return PLAID_CATEGORY_TO_BUDGET_BUCKET.get(primary, PLAID_CATEGORY_TO_BUDGET_BUCKET["_DEFAULT_"])
-    
+         if not plaid_categories: return DEFAULT_BUDGET_BUCKET
+         return PLAID_CATEGORY_TO_BUDGET_BUCKET.get(plaid_categories[0], DEFAULT_BUDGET_BUCKET)
+
+    def _transaction_row(self, txn_data, account_db_id):
+         """Builds a Transaction insert row from a Plaid transaction dict."""
+         categories = txn_data.get('category') or []
+         return {
+             'account_db_id': account_db_id, 'plaid_transaction_id': txn_data['transaction_id'],
+             'plaid_account_id': txn_data['account_id'], 'name': txn_data.get('name', txn_data.get('merchant_name', 'N/A')),
+             'merchant_name': txn_data.get('merchant_name'), 'amount': txn_data['amount'], 'currency_code': txn_data['iso_currency_code'],
+             'date': txn_data['date'], 'pending': txn_data['pending'],
+             'plaid_primary_category': categories[0] if categories else None,
+             'plaid_detailed_category': categories[-1] if categories else None,
+             'plaid_category_id': txn_data.get('category_id'),
+             'budget_category': self._map_category(categories)
+         }
+
+    def _upsert_transactions(self, rows):
+         """
+         Inserts or updates Transaction rows in one INSERT ... ON CONFLICT (plaid_transaction_id) statement.
+         Category columns keep their stored value when Plaid sends none.
+         Returns (created, updated) counts derived from RETURNING (xmax = 0).
+         """
+         if not rows:
+             return 0, 0
+         stmt = pg_insert(Transaction).values(rows)
+         excluded = stmt.excluded
+         stmt = stmt.on_conflict_do_update(
+             index_elements=['plaid_transaction_id'],
+             set_={
+                 'amount': excluded.amount, 'pending': excluded.pending,
+                 'name': excluded.name, 'merchant_name': excluded.merchant_name,
+                 'date': excluded.date, 'budget_category': excluded.budget_category,
+                 'plaid_primary_category': func.coalesce(excluded.plaid_primary_category, Transaction.plaid_primary_category),
+                 'plaid_detailed_category': func.coalesce(excluded.plaid_detailed_category, Transaction.plaid_detailed_category),
+                 'plaid_category_id': func.coalesce(excluded.plaid_category_id, Transaction.plaid_category_id),
+                 'updated_at': func.now()
+             }
+         ).returning((literal_column('xmax') == 0).label('inserted'))
+         inserted_flags = [row.inserted for row in db.session.execute(stmt)]
+         created = sum(1 for flag in inserted_flags if flag)
+         return created, len(inserted_flags) - created
+
+    def _fetch_sync_page(self, access_token, cursor):
+         """
+         Fetches one /transactions/sync page as the SDK's typed response model (no .to_dict() copy).
+         The models support item access and .get(), so transactions are read in place.
+         """
+         request = TransactionsSyncRequest(
+             access_token=access_token,
+             cursor=cursor,
+             count=TRANSACTIONS_SYNC_PAGE_SIZE
+         )
+         return self.client.transactions_sync(request)
+
     def sync_transactions_for_item(self, item: PlaidItem):
         self.logger.info(f"Starting transaction sync for Item ID: {item.item_id}, {item.sync_cursor}")
         access_token = item.access_token
@@ -39,76 +97,55 @@ class PlaidService:
 
         if cursor == None: cursor = ""
 
+        # Double-buffer the pages: the next page is requested from Plaid while the current one
+        # is written to the DB. Nothing is committed per page: all pages and the new cursor commit
+        # once after the last page, and any failure rolls the whole sync back.
+        prefetcher = ThreadPoolExecutor(max_workers=1)
         try:
+            next_page = prefetcher.submit(self._fetch_sync_page, access_token, cursor)
+            all_removed_ids = [] # Deleted in one statement once every page is in
             has_more = True
             while has_more:
-                request = TransactionsSyncRequest(
-                    access_token=access_token,
-                    cursor=cursor,
-                    count=100 # Fetch 100 transactions per page (adjust as needed)
-                )
-                response = self.client.transactions_sync(request).to_dict() # Use .to_dict()
-
-                added = response.get('added', [])
-                modified = response.get('modified', [])
-                removed = response.get('removed', [])
-                has_more = response.get('has_more', False)
-                next_cursor = response.get('next_cursor') # Get the new cursor
+                response = next_page.result()
+
+                added = response.added
+                modified = response.modified
+                removed = response.removed
+                has_more = response.has_more
+                next_cursor = response.next_cursor # Get the new cursor
+                if has_more:
+                    next_page = prefetcher.submit(self._fetch_sync_page, access_token, next_cursor)
 
                 self.logger.info(f"Sync page fetched: Added({len(added)}), Mod({len(modified)}), Rem({len(removed)}), More({has_more})")
 
                 # --- Process Added/Modified/Removed (within a DB transaction) ---
                 try:
-                    # Added
-                    for txn_data in added:
-                        acc = Account.query.filter_by(external_id=txn_data['account_id']).first() # Match any Plaid account
-                        if not acc:
+                    # Added + Modified: resolve every referenced account in one query, then upsert the
+                    # page in one statement (a duplicate add becomes an update, a modified txn we never
+                    # stored becomes an insert). Modified entries come last, so they win on repeated ids.
+                    page_txns = added + modified
+                    plaid_account_ids = {t['account_id'] for t in page_txns}
+                    account_db_ids = dict(db.session.execute(
+                        select(Account.external_id, Account.id).where(Account.external_id.in_(plaid_account_ids))
+                    ).all()) if plaid_account_ids else {}
+
+                    rows = {}
+                    for txn_data in page_txns:
+                        account_db_id = account_db_ids.get(txn_data['account_id']) # Match any Plaid account
+                        if account_db_id is None:
                              self.logger.warning(f"Account not found for Plaid acc ID {txn_data['account_id']}. Skipping txn {txn_data['transaction_id']}.")
                              continue
-                        if Transaction.query.filter_by(plaid_transaction_id=txn_data['transaction_id']).first():
-                             self.logger.warning(f"Duplicate add: Transaction {txn_data['transaction_id']} already exists. Treating as modified.")
-                             modified.append(txn_data) # Add to modified list to handle below
-                             continue
+                        rows[txn_data['transaction_id']] = self._transaction_row(txn_data, account_db_id)
 
-                        budget_cat = self._map_category(txn_data.get('category'))
-                        new_txn = Transaction(
-                            account_db_id=acc.id, plaid_transaction_id=txn_data['transaction_id'],
-                            plaid_account_id=txn_data['account_id'], name=txn_data.get('name', txn_data.get('merchant_name', 'N/A')),
-                            merchant_name=txn_data.get('merchant_name'), amount=txn_data['amount'], currency_code=txn_data['iso_currency_code'],
-                            date=txn_data['date'], pending=txn_data['pending'], plaid_primary_category=txn_data.get('category', [None])[0],
-                            plaid_detailed_category=txn_data.get('category', [])[-1], plaid_category_id=txn_data.get('category_id'),
-                            budget_category=budget_cat )
-                        db.session.add(new_txn)
-                        added_count += 1
-
-                    # Modified
-                    for txn_data in modified:
-                        txn = Transaction.query.filter_by(plaid_transaction_id=txn_data['transaction_id']).first()
-                        if txn:
-                            txn.amount = txn_data['amount']; txn.pending = txn_data['pending']
-                            txn.name = txn_data.get('name', txn_data.get('merchant_name', txn.name))
-                            txn.merchant_name=txn_data.get('merchant_name'); txn.date = txn_data['date'] # Date can change too
-                            txn.budget_category = self._map_category(txn_data.get('category'))
-                            txn.plaid_primary_category=txn_data.get('category', [txn.plaid_primary_category])[0]
-                            txn.plaid_detailed_category=txn_data.get('category', [txn.plaid_detailed_category])[-1]
-                            txn.plaid_category_id=txn_data.get('category_id', txn.plaid_category_id)
-                            modified_count += 1
-                        else: self.logger.warning(f"Modified txn {txn_data['transaction_id']} not found locally.")
-
-                    # Removed
-                    removed_ids = [rt['transaction_id'] for rt in removed]
-                    if removed_ids:
-                         delete_q = Transaction.__table__.delete().where(Transaction.plaid_transaction_id.in_(removed_ids))
-                         result = db.session.execute(delete_q)
-                         removed_count += result.rowcount
-                         if result.rowcount != len(removed_ids):
-                             self.logger.warning(f"Attempted to delete {len(removed_ids)} txns, but only {result.rowcount} were found/deleted.")
+                    created, updated = self._upsert_transactions(list(rows.values()))
+                    added_count += created
+                    modified_count += updated
 
-                    # --- Commit changes for this page ---
-                    db.session.commit()
-                    self.logger.info("Committed transaction sync page changes.")
-                    # Update cursor for next loop iteration *after* successful commit
-                    cursor = next_cursor
+                    # Removed (collected here, deleted after the last page)
+                    all_removed_ids.extend(rt['transaction_id'] for rt in removed)
+
+                    # Pages are not committed individually: the whole sync commits together with the
+                    # new cursor below, so a failure part-way leaves both the rows and the cursor untouched
 
                 except SQLAlchemyError as db_err:
                     db.session.rollback()
@@ -117,29 +154,38 @@ class PlaidService:
                     break # Stop processing this item    
                 # End of while has_more loop
 
-            # --- Update Item's Cursor ---
-            if not item_failed and next_cursor: # Only update cursor if sync didn't fail mid-way
+            # --- Commit all pages together with the Item's new cursor ---
+            if not item_failed: # Only commit if sync didn't fail mid-way
                 try:
-                     item.sync_cursor = next_cursor
+                     if all_removed_ids:
+                         delete_q = Transaction.__table__.delete().where(Transaction.plaid_transaction_id.in_(all_removed_ids))
+                         result = db.session.execute(delete_q)
+                         removed_count += result.rowcount
+                         if result.rowcount != len(all_removed_ids):
+                             self.logger.warning(f"Attempted to delete {len(all_removed_ids)} txns, but only {result.rowcount} were found/deleted.")
+                     if next_cursor:
+                         item.sync_cursor = next_cursor
                      db.session.commit()
-                     self.logger.info(f"Updated sync cursor for Item {item.item_id}")
+                     self.logger.info(f"Committed transaction sync and cursor for Item {item.item_id}")
                 except SQLAlchemyError as db_err:
                      db.session.rollback()
-                     self.logger.error(f"Database error updating cursor for Item {item.item_id}: {db_err}", exc_info=True)
-                     item_failed = True # Mark as failed if cursor save fails
+                     self.logger.error(f"Database error committing sync for Item {item.item_id}: {db_err}", exc_info=True)
+                     item_failed = True # Mark as failed if the commit fails
 
-            # --- History Cleanup (Optional: run after successful sync) ---
-            if not item_failed:
-
-                self.cleanup_old_transactions()
+            # History cleanup runs once per sync cycle (see background_sync_job), not per item
             self.logger.info(f"Transaction sync finished for Item {item.item_id}. Added: {added_count}, Mod: {modified_count}, Rem: {removed_count}. Failed: {item_failed}")
             return not item_failed # Return True on success, False on failure
         except ApiException as e:
+            db.session.rollback() # Discard pages written before the failing request
             self.logger.error(f"Plaid API error syncing transactions for Item {item.item_id}: {getattr(e, 'body', e)}", exc_info=True)
             return False # Indicate failure
         except Exception as e:
+            db.session.rollback()
             self.logger.error(f"Unexpected error syncing transactions for Item {item.item_id}: {e}", exc_info=True)
             return False # Indicate failure
+        finally:
+            # Don't block on a prefetched page that a failed sync no longer needs
+            prefetcher.shutdown(wait=False)
 
     def cleanup_old_transactions(self):
 
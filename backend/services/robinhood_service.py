@@ -1,11 +1,12 @@
 # backend/services/robinhood_service.py
 import requests
 import time
-import json
+import orjson
 import base64
 from urllib.parse import urlparse, urlunparse # For cleaning URLs
 import nacl.signing
 import nacl.encoding
+from services.http_session import create_session
 
 class RobinhoodService:
     """
@@ -13,13 +14,17 @@ class RobinhoodService:
     """
     # Using API base documented for Crypto Trading API
     BASE_URL = "https://api.robinhood.com"
+    REQUEST_TIMEOUT = 10 # Seconds
+    REQUEST_RETRIES = 3 # Transport-level retries for connection errors and 429/5xx on idempotent calls
 
     def __init__(self, pri_key, pub_key, api_key, logger):
         if not pri_key or not pub_key or not api_key:
              raise ValueError("Robinhood API Key and Secret must be provided.")
         self.api_key = api_key
+        self._api_key_b = api_key.encode('utf-8') # Signed on every request
+        self._base_headers = {'Accept': 'application/json', 'X-Api-Key': api_key}
         self.logger = logger
-        self.session = requests.Session() # Use a session for potential connection reuse
+        self.session = create_session(retries=self.REQUEST_RETRIES) # Pooled keep-alive connections
         # --- Temporary Debug Print ---
         # Safely print only the start/end and length to avoid exposing full key in logs
         safe_key_repr = f"'{pri_key[:5]}...{pri_key[-5:]}' (Length: {len(pri_key)})" if pri_key and len(pri_key) > 10 else "'Invalid or too short'"
@@ -35,7 +40,7 @@ class RobinhoodService:
             self.logger.error(f"Failed to decode/initialize Robinhood private key: {e}", exc_info=True)
             raise ValueError("Invalid Robinhood private key provided.") from e
 
-    def _generate_ed25519_auth_headers(self, method: str, path: str, body_str: str = "") -> dict:
+    def _generate_ed25519_auth_headers(self, method: str, path: str, body_bytes: bytes = b"") -> dict:
         """Generates Ed25519 authentication headers."""
         # Ensure path starts with '/' and includes API version if needed (e.g., /api/v1/)
         if not path.startswith('/'):
@@ -47,23 +52,20 @@ class RobinhoodService:
 
         timestamp = str(int(time.time())) # Timestamp in SECONDS as string
 
-        # Message: API_Key + Timestamp + Path + Method + Body
-        message = f"{self.api_key}{timestamp}{path}{method}{body_str}"
-        self.logger.debug(f"Robinhood signing message: {message}")
+        # Message: API_Key + Timestamp + Path + Method + Body, joined as bytes so the body isn't copied through a str
+        message = b"".join((self._api_key_b, timestamp.encode(), path.encode("utf-8"), method.encode(), body_bytes))
+        self.logger.debug(f"Robinhood signing message for {method} {path} @ {timestamp} ({len(message)} bytes)")
 
         # Sign the message using the private key
-        signed = self.signing_key.sign(message.encode("utf-8"))
+        signed = self.signing_key.sign(message)
 
         # Base64 encode the raw signature
         b64_signature = base64.b64encode(signed.signature).decode("utf-8")
 
-        headers = {
-            'Accept': 'application/json',
-            'X-Api-Key': self.api_key,
-            'X-Timestamp': timestamp,
-            'X-Signature': b64_signature, # The Base64 encoded Ed25519 signature
-        }
-        if body_str:
+        headers = self._base_headers.copy()
+        headers['X-Timestamp'] = timestamp
+        headers['X-Signature'] = b64_signature # The Base64 encoded Ed25519 signature
+        if body_bytes:
             headers['Content-Type'] = 'application/json; charset=utf-8'
 
         return headers
@@ -77,13 +79,13 @@ class RobinhoodService:
              self.logger.warning(f"Prepending /api/v1 to endpoint: {endpoint}")
 
         full_url = self.BASE_URL.rstrip('/') + '/' + endpoint.lstrip('/')
-        body_str = json.dumps(data) if data else ""
+        body_bytes = orjson.dumps(data) if data else b"" # Already bytes: signed and sent as-is
 
         # Path for signature should likely match the endpoint used in the URL
         path_for_sig = urlparse(full_url).path
 
-        headers = self._generate_ed25519_auth_headers(method.upper(), path_for_sig, body_str)
-        self.logger.debug(f"Robinhood Request: {method} {full_url} Headers: {headers} Params: {params} Body: {body_str}")
+        headers = self._generate_ed25519_auth_headers(method.upper(), path_for_sig, body_bytes)
+        self.logger.debug(f"Robinhood Request: {method} {full_url} Headers: {headers} Params: {params} Body: {body_bytes}")
 
         try:
             response = self.session.request(
@@ -91,7 +93,8 @@ class RobinhoodService:
                 full_url,
                 headers=headers,
                 params=params,
-                data=body_str.encode('utf-8') if body_str else None # Send body as bytes
+                data=body_bytes or None, # Send the signed body bytes as-is
+                timeout=self.REQUEST_TIMEOUT
             )
             self.logger.debug(f"Robinhood Response Status: {response.status_code}")
             self.logger.debug(f"Robinhood Response Body: {response.text[:500]}...") # Log truncated body
@@ -100,7 +103,7 @@ class RobinhoodService:
                  # Check content type before assuming JSON
                  content_type = response.headers.get('Content-Type', '')
                  if 'application/json' in content_type:
-                      return response.json()
+                      return orjson.loads(response.content)
                  else:
                       self.logger.warning(f"Unexpected Content-Type: {content_type}")
                       return {"raw_content": response.text}
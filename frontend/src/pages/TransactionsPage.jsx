@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import axios from 'axios';
 import BudgetSummaryTransactions from '../components/BudgetSummaryTransactions.jsx'
 
@@ -18,8 +18,10 @@ const formatCurrency = (value) => {
 const TransactionsPage = () => {
     const [transactions, setTransactions] = useState([]);
     const [pagination, setPagination] = useState({
-        page: 1, per_page: 50, total_items: 0, total_pages: 1
+        page: 1, per_page: 50, next_cursor: null, has_more: false
     });
+    // Keyset cursors: cursorsRef.current[i] is the cursor that loads page i + 1
+    const cursorsRef = useRef([null]);
     const [filters, setFilters] = useState({
         category: '', start_date: '', end_date: '' // Add account_id later if needed
     });
@@ -48,7 +50,8 @@ const TransactionsPage = () => {
 
         // Construct params specific to transaction list (pagination, sorting)
         const txnListParams = new URLSearchParams(params); // Clone base filters
-        txnListParams.append('page', pagination.page);
+        const cursor = cursorsRef.current[pagination.page - 1];
+        if (cursor) txnListParams.append('cursor', cursor);
         txnListParams.append('per_page', pagination.per_page);
         txnListParams.append('sort_by', sorting.sort_by);
         txnListParams.append('sort_dir', sorting.sort_dir);
@@ -66,7 +69,10 @@ const TransactionsPage = () => {
 
             // Process transaction list response
             setTransactions(txnResponse.data.transactions || []);
-            setPagination(txnResponse.data.pagination || { page: 1, per_page: 50, total_items: 0, total_pages: 1 });
+            const pageInfo = txnResponse.data.pagination || { next_cursor: null, has_more: false };
+            // Remember where the next page starts so "Next" can request it
+            cursorsRef.current[pagination.page] = pageInfo.next_cursor;
+            setPagination(prev => ({ ...prev, next_cursor: pageInfo.next_cursor, has_more: pageInfo.has_more }));
             console.log("Fetched transactions:", txnResponse.data);
 
             // Process summary response
@@ -108,6 +114,7 @@ const TransactionsPage = () => {
             // Toggle direction if same column clicked, else default to desc
             sort_dir: prev.sort_by === column && prev.sort_dir === 'desc' ? 'asc' : 'desc'
         }));
+        cursorsRef.current = [null];
         setPagination(prev => ({ ...prev, page: 1 })); // Reset to page 1 on sort change
     };
 
@@ -119,12 +126,13 @@ const TransactionsPage = () => {
 
     const handleFilterSubmit = (e) => {
          e.preventDefault();
+         cursorsRef.current = [null];
          setPagination(prev => ({ ...prev, page: 1 })); // Reset to page 1 on filter change
          // fetchTransactions(); // Re-fetch with new filters (needed if not fetching on change)
     };
 
     const handlePageChange = (newPage) => {
-        if (newPage >= 1 && newPage <= pagination.total_pages) {
+        if (newPage >= 1 && (newPage <= pagination.page || pagination.has_more)) {
             setPagination(prev => ({ ...prev, page: newPage }));
         }
     };
@@ -200,9 +208,9 @@ const TransactionsPage = () => {
                     <div style={{ marginTop: '15px' }}>
                          <button onClick={() => handlePageChange(pagination.page - 1)} disabled={pagination.page <= 1}> Previous </button>
                          <span style={{ margin: '0 10px' }}>
-                             Page {pagination.page} of {pagination.total_pages} ({pagination.total_items} items)
+                             Page {pagination.page}
                          </span>
-                         <button onClick={() => handlePageChange(pagination.page + 1)} disabled={pagination.page >= pagination.total_pages}> Next </button>
+                         <button onClick={() => handlePageChange(pagination.page + 1)} disabled={!pagination.has_more}> Next </button>
                     </div>
                     {/* ------------------------- */}
                 </>